@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Сборка статики сайта из src/ в dist/
+Добавляет хэш содержимого в имена ассетов, переписывает ссылки на них
+и генерирует service worker (sw.js) с precache-списком и офлайн-страницей.
+По графу зависимостей страниц строит заголовки Link (preload/preconnect)
+для nginx веб-контейнера и помечает некритичные скрипты как defer
+"""
+
+import os
+import re
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+from html.parser import HTMLParser
+from pathlib import Path
+from urllib.parse import urlparse
+
+# Конфигурация
+ROOT = Path(__file__).resolve().parent
+SRC_DIR = ROOT / "src"
+DIST_DIR = ROOT / "dist"
+NGINX_DIR = ROOT / "dist-nginx"
+CACHE_PREFIX = "service-moscow"
+OFFLINE_PAGE = "offline.html"
+HASH_LENGTH = 8
+
+# Файлы, которые не копируются в сборку
+SKIP_NAMES = {".gitkeep", ".DS_Store"}
+# Текстовые ассеты, внутри которых тоже переписываются ссылки
+TEXT_SUFFIXES = {".css", ".js", ".svg", ".webmanifest"}
+# Порядок обработки: сначала листовые ассеты, потом то, что на них ссылается
+HASH_ORDER = {".css": 1, ".js": 2}
+
+# Классы предков, внутри которых картинка считается главной (LCP-кандидат)
+HERO_CLASSES = {"hero", "page-hero"}
+FONT_SUFFIXES = {".woff2", ".woff", ".ttf", ".otf"}
+# Внешние источники, которые разрешает CSP edge nginx (nginx/conf.d/site.conf и
+# шаблон в deploy.py): подсказки на другие источники дали бы лишь нарушения CSP
+CSP_ORIGINS = {"https://fonts.googleapis.com", "https://fonts.gstatic.com"}
+CSS_URL_RE = re.compile(r"url\(\s*['\"]?([^'\")]+)['\"]?\s*\)")
+# Тег <script src=...> без defer/async/type (ld+json и модули не трогаем)
+BLOCKING_SCRIPT_RE = re.compile(r"<script\b(?![^>]*\b(?:defer|async|type)\b)(?=[^>]*\bsrc=)")
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input",
+             "link", "meta", "source", "track", "wbr"}
+
+NGINX_TEMPLATE = """# Сгенерировано build.py — не редактировать вручную
+# Конфигурация nginx веб-контейнера с заголовками Link для каждой страницы
+server {
+    listen 80;
+    server_name _;
+    root /usr/share/nginx/html;
+    index index.html;
+
+    location / {
+        try_files $uri $uri/ =404;
+    }
+
+    # Service worker всегда проверяется заново, иначе браузер не узнает о новой сборке
+    location = /sw.js {
+        add_header Cache-Control "no-cache";
+    }
+__LOCATIONS__}
+"""
+
+SW_TEMPLATE = """/* Service worker generated by build.py — do not edit by hand */
+const BUILD = '__BUILD__';
+const STATIC_CACHE = '__PREFIX__-static-' + BUILD;
+const PAGES_CACHE = '__PREFIX__-pages-' + BUILD;
+const OFFLINE_URL = '__OFFLINE__';
+const STATIC_ASSETS = __ASSETS__;
+const PAGES = __PAGES__;
+const HASHED = new Set(STATIC_ASSETS);
+
+self.addEventListener('install', (event) => {
+    event.waitUntil((async () => {
+        const staticCache = await caches.open(STATIC_CACHE);
+        // Immutable assets from a previous build are reused instead of refetched
+        await Promise.all(STATIC_ASSETS.map(async (url) => {
+            let response = await caches.match(url);
+            if (!response) {
+                response = await fetch(url, { cache: 'no-cache' });
+                // Unlike addAll, put() stores 404/5xx too: fail the install so it is retried
+                if (!response.ok) {
+                    throw new Error(`precache ${url}: HTTP ${response.status}`);
+                }
+            }
+            await staticCache.put(url, response);
+        }));
+        const pagesCache = await caches.open(PAGES_CACHE);
+        await pagesCache.addAll(PAGES.map((url) => new Request(url, { cache: 'no-cache' })));
+        await self.skipWaiting();
+    })());
+});
+
+self.addEventListener('activate', (event) => {
+    event.waitUntil((async () => {
+        const keep = [STATIC_CACHE, PAGES_CACHE];
+        const names = await caches.keys();
+        await Promise.all(names
+            .filter((name) => name.startsWith('__PREFIX__-') && !keep.includes(name))
+            .map((name) => caches.delete(name)));
+        await self.clients.claim();
+    })());
+});
+
+// Cache-first: hashed files never change under the same URL
+async function cacheFirst(request) {
+    const cached = await caches.match(request);
+    if (cached) {
+        return cached;
+    }
+    const response = await fetch(request);
+    if (response.ok) {
+        const cache = await caches.open(STATIC_CACHE);
+        cache.put(request, response.clone());
+    }
+    return response;
+}
+
+// Stale-while-revalidate: answer from cache, refresh it in the background
+async function staleWhileRevalidate(event) {
+    const request = event.request;
+    const cache = await caches.open(PAGES_CACHE);
+    const cached = await cache.match(request, { ignoreSearch: true });
+    const network = fetch(request)
+        .then((response) => {
+            if (response.ok) {
+                cache.put(request, response.clone());
+            }
+            return response;
+        });
+
+    if (cached) {
+        event.waitUntil(network.catch(() => {}));
+        return cached;
+    }
+    try {
+        return await network;
+    } catch (e) {
+        return (await cache.match(OFFLINE_URL)) || Response.error();
+    }
+}
+
+self.addEventListener('fetch', (event) => {
+    const request = event.request;
+    const url = new URL(request.url);
+    if (request.method !== 'GET' || url.origin !== self.location.origin || url.pathname.startsWith('/api/')) {
+        return;
+    }
+
+    if (HASHED.has(url.pathname)) {
+        event.respondWith(cacheFirst(request));
+    } else if (request.mode === 'navigate' || (request.headers.get('accept') || '').includes('text/html')) {
+        event.respondWith(staleWhileRevalidate(event));
+    }
+});
+"""
+
+
+class Colors:
+    GREEN = '\033[92m'
+    RED = '\033[91m'
+    YELLOW = '\033[93m'
+    BLUE = '\033[94m'
+    BOLD = '\033[1m'
+    END = '\033[0m'
+
+
+def log(msg, color=Colors.GREEN):
+    print(f"{color}[BUILD] {msg}{Colors.END}")
+
+
+def error(msg):
+    print(f"{Colors.RED}[ERROR] {msg}{Colors.END}")
+    sys.exit(1)
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(rel_path, digest):
+    """css/style.css -> css/style.1a2b3c4d.css"""
+    path = Path(rel_path)
+    return str(path.with_name(f"{path.stem}.{digest}{path.suffix}")).replace(os.sep, "/")
+
+
+def page_url(rel_path):
+    """index.html -> /, blog/index.html -> /blog/, about.html -> /about.html"""
+    if rel_path == "index.html":
+        return "/"
+    if rel_path.endswith("/index.html"):
+        return "/" + rel_path[:-len("index.html")]
+    return "/" + rel_path
+
+
+def rewrite_refs(text, mapping):
+    """Заменить абсолютные ссылки на ассеты их хэшированными именами"""
+    for original, hashed in mapping.items():
+        pattern = r"(?<=[\"'(=\s])/" + re.escape(original) + r"(?=[\"')?#\s]|$)"
+        text = re.sub(pattern, "/" + hashed, text)
+    return text
+
+
+class DependencyParser(HTMLParser):
+    """Собирает ресурсы, нужные странице для первой отрисовки"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stylesheets = []
+        self.preconnects = []
+        self.hero_images = []
+        self.stack = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = set((attrs.get("class") or "").split())
+        if tag == "link":
+            rel = set((attrs.get("rel") or "").lower().split())
+            href = attrs.get("href")
+            if href and "stylesheet" in rel:
+                self.stylesheets.append(href)
+            elif href and "preconnect" in rel:
+                self.preconnects.append((href, "crossorigin" in attrs))
+        elif tag == "img" and attrs.get("src") and attrs.get("loading") != "lazy":
+            in_hero = any(HERO_CLASSES & c for c in self.stack)
+            if attrs.get("fetchpriority") == "high" or in_hero:
+                self.hero_images.append(attrs["src"])
+        if tag not in VOID_TAGS:
+            self.stack.append(classes)
+
+    def handle_endtag(self, tag):
+        if tag not in VOID_TAGS and self.stack:
+            self.stack.pop()
+
+
+def origin_of(url):
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}" if parsed.netloc else None
+
+
+def allowed_by_csp(url):
+    origin = origin_of(url)
+    return origin is None or origin in CSP_ORIGINS
+
+
+def page_dependencies(html, out):
+    """Граф зависимостей страницы: список (url, rel, as, crossorigin) для Link"""
+    parser = DependencyParser()
+    parser.feed(html)
+
+    deps = []
+    seen = set()
+
+    def add(url, rel, kind=None, crossorigin=False):
+        if allowed_by_csp(url) and (url, rel) not in seen:
+            seen.add((url, rel))
+            deps.append((url, rel, kind, crossorigin))
+
+    # Соединения с внешними источниками открываем раньше всего
+    for href, crossorigin in parser.preconnects:
+        add(href, "preconnect", crossorigin=crossorigin)
+    for url in parser.stylesheets + parser.hero_images:
+        origin = origin_of(url)
+        if origin:
+            add(origin, "preconnect")
+
+    # Сами CSS из <head> не подсказываем: без 103 Early Hints заголовок Link приходит
+    # вместе с разметкой, и preload-сканер находит их в то же время.
+    # Выигрыш дают только ресурсы, которые иначе нашлись бы позже
+    for href in parser.stylesheets:
+        # Шрифты из своих CSS находятся только после загрузки CSS
+        if not origin_of(href) and (out / href.lstrip("/")).is_file():
+            css = (out / href.lstrip("/")).read_text(encoding="utf-8")
+            for ref in CSS_URL_RE.findall(css):
+                if ref.startswith("/") and Path(ref.split("?")[0]).suffix in FONT_SUFFIXES:
+                    add(ref, "preload", "font", crossorigin=True)
+    for src in parser.hero_images:
+        add(src, "preload", "image")
+    # Скрипты не подсказываем: после defer_scripts все они некритичные, а preload
+    # поднял бы их приоритет до уровня CSS и шрифтов
+    return deps
+
+
+def link_header(deps):
+    """Значение заголовка Link из списка зависимостей"""
+    parts = []
+    for url, rel, kind, crossorigin in deps:
+        part = f"<{url}>; rel={rel}"
+        if kind:
+            part += f"; as={kind}"
+        if crossorigin:
+            part += "; crossorigin"
+        parts.append(part)
+    return ", ".join(parts)
+
+
+def defer_scripts(html):
+    """Пометить внешние скрипты без async/defer как defer"""
+    return BLOCKING_SCRIPT_RE.sub("<script defer", html)
+
+
+def write_nginx_conf(hints, nginx_dir):
+    """Конфигурация nginx веб-контейнера и JSON с заголовками Link по страницам"""
+    locations = []
+    for rel, header in sorted(hints.items()):
+        value = header.replace("\\", "\\\\").replace('"', '\\"')
+        locations.append(
+            f"\n    location = /{rel} {{\n"
+            f"        add_header Link \"{value}\";\n"
+            f"    }}\n")
+    nginx_dir.mkdir(parents=True, exist_ok=True)
+    (nginx_dir / "default.conf").write_text(
+        NGINX_TEMPLATE.replace("__LOCATIONS__", "".join(locations)), encoding="utf-8")
+    (nginx_dir / "preload-hints.json").write_text(
+        json.dumps({page_url(rel): header for rel, header in hints.items()},
+                   ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def collect_files(src):
+    pages = []
+    assets = []
+    for path in sorted(src.rglob("*")):
+        if not path.is_file() or path.name in SKIP_NAMES:
+            continue
+        rel = path.relative_to(src).as_posix()
+        if rel == "sw.js":
+            continue
+        if path.suffix == ".html":
+            pages.append(rel)
+        else:
+            assets.append(rel)
+    assets.sort(key=lambda rel: (HASH_ORDER.get(Path(rel).suffix, 0), rel))
+    return pages, assets
+
+
+def build(src=SRC_DIR, out=DIST_DIR, nginx_dir=NGINX_DIR):
+    """Собрать сайт; возвращает хэш сборки"""
+    src = Path(src)
+    out = Path(out)
+    nginx_dir = Path(nginx_dir)
+    if not src.is_dir():
+        error(f"Нет каталога с исходниками: {src}")
+    if not (src / OFFLINE_PAGE).exists():
+        error(f"Нет офлайн-страницы: {src / OFFLINE_PAGE}")
+
+    if out.exists():
+        shutil.rmtree(out)
+    out.mkdir(parents=True)
+
+    pages, assets = collect_files(src)
+    mapping = {}
+    build_hash = hashlib.sha256()
+
+    for rel in assets:
+        data = (src / rel).read_bytes()
+        if Path(rel).suffix in TEXT_SUFFIXES:
+            data = rewrite_refs(data.decode("utf-8"), mapping).encode("utf-8")
+        target = hashed_name(rel, content_hash(data))
+        mapping[rel] = target
+        build_hash.update(target.encode())
+        (out / target).parent.mkdir(parents=True, exist_ok=True)
+        (out / target).write_bytes(data)
+        log(f"{rel} -> {target}", Colors.BLUE)
+
+    page_urls = []
+    hints = {}
+    for rel in pages:
+        text = rewrite_refs((src / rel).read_text(encoding="utf-8"), mapping)
+        deps = page_dependencies(text, out)
+        if deps:
+            hints[rel] = link_header(deps)
+        text = defer_scripts(text)
+        data = text.encode("utf-8")
+        build_hash.update(rel.encode() + data)
+        (out / rel).parent.mkdir(parents=True, exist_ok=True)
+        (out / rel).write_bytes(data)
+        page_urls.append(page_url(rel))
+
+    digest = build_hash.hexdigest()[:HASH_LENGTH]
+    sw = (SW_TEMPLATE
+          .replace("__BUILD__", digest)
+          .replace("__PREFIX__", CACHE_PREFIX)
+          .replace("__OFFLINE__", page_url(OFFLINE_PAGE))
+          .replace("__ASSETS__", json.dumps(["/" + t for t in mapping.values()]))
+          .replace("__PAGES__", json.dumps(page_urls)))
+    (out / "sw.js").write_text(sw, encoding="utf-8")
+    write_nginx_conf(hints, nginx_dir)
+
+    log(f"Страниц: {len(page_urls)}, ассетов: {len(mapping)}, сборка {digest}")
+    return digest
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Сборка статики сайта и service worker")
+    parser.add_argument("--src", default=str(SRC_DIR), help="Каталог исходников")
+    parser.add_argument("--out", default=str(DIST_DIR), help="Каталог сборки")
+    parser.add_argument("--nginx-out", default=str(NGINX_DIR),
+                        help="Куда записать конфигурацию nginx с заголовками Link")
+    args = parser.parse_args()
+    build(args.src, args.out, args.nginx_out)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,56 @@ EMAIL = "artur.komarovv@gmail.com"
 PROJECT_NAME = "service-moscow"
 INSTALL_DIR = f"/opt/{PROJECT_NAME}"
 
+# Образы, собираемые из исходников: сервис -> каталог контекста сборки.
+# Теги совпадают с image: в docker-compose.yml, поэтому compose up --no-build берёт готовые
+BUILD_CONTEXTS = {"web": ".", "lead": "services/lead", "rum": "services/rum"}
+
+# Сервис приёма заявок с форм (services/lead) и сборщик RUM-метрик (services/rum).
+# Имена резолвятся во время работы через DNS Docker (resolve, nginx 1.27.3+):
+# упавший сервис даёт 502 на /api/*, а не мешает nginx стартовать
+API_UPSTREAMS = f'''upstream {PROJECT_NAME.replace("-", "_")}_lead {{
+    zone {PROJECT_NAME.replace("-", "_")}_lead 64k;
+    resolver 127.0.0.11 valid=10s ipv6=off;
+    server {PROJECT_NAME}-lead:8080 resolve;
+    keepalive 32;
+}}
+
+upstream {PROJECT_NAME.replace("-", "_")}_rum {{
+    zone {PROJECT_NAME.replace("-", "_")}_rum 64k;
+    resolver 127.0.0.11 valid=10s ipv6=off;
+    server {PROJECT_NAME}-rum:8081 resolve;
+    keepalive 16;
+}}
+'''
+
+API_LOCATIONS = f'''    location = /api/lead {{
+        limit_except POST {{
+            deny all;
+        }}
+        client_max_body_size 16k;
+        proxy_pass http://{PROJECT_NAME.replace("-", "_")}_lead;
+        proxy_http_version 1.1;
+        proxy_set_header Connection "";
+        proxy_set_header Host $host;
+        proxy_set_header X-Real-IP $remote_addr;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_read_timeout 15s;
+    }}
+
+    location = /api/rum {{
+        limit_except POST {{
+            deny all;
+        }}
+        client_max_body_size 4k;
+        access_log off;
+        proxy_pass http://{PROJECT_NAME.replace("-", "_")}_rum;
+        proxy_http_version 1.1;
+        proxy_set_header Connection "";
+        proxy_set_header Host $host;
+        proxy_read_timeout 5s;
+    }}
+'''
+
 class Colors:
     GREEN = '\033[92m'
     RED = '\033[91m'
@@ -53,6 +103,94 @@ def run_cmd(cmd, check=True, capture=False):
             error(f"Команда завершилась с ошибкой: {cmd}")
         return False
 
+_docker = None
+
+def docker():
+    """Клиент Docker Engine API (docker_api.py) или None - тогда работаем через CLI"""
+    global _docker
+    if _docker is None:
+        # deploy.py часто скачивают отдельно: docker_api.py появится в INSTALL_DIR после клонирования
+        if INSTALL_DIR not in sys.path:
+            sys.path.append(INSTALL_DIR)
+        try:
+            import docker_api
+        except ImportError:
+            return None
+        _docker = docker_api.connect() or False
+    return _docker or None
+
+def wait_for_services(services, fallback_sleep=10):
+    """Ждать healthy-статуса контейнеров по событиям Docker вместо sleep"""
+    client = docker()
+    if client is None:
+        time.sleep(fallback_sleep)
+        return
+    import docker_api
+    for service in services:
+        container = f"{PROJECT_NAME}-{service}"
+        log(f"Docker API: жду готовности {container}", Colors.BLUE)
+        try:
+            status = client.wait_healthy(container, timeout=120)
+        except docker_api.ERRORS as e:
+            status = getattr(e, "message", None) or str(e)
+        if status in ("healthy", "running"):
+            log(f"{container}: {status}")
+        else:
+            warning(f"{container}: {status}")
+
+def reload_nginx():
+    """Перечитать конфигурацию edge nginx"""
+    client = docker()
+    if client is None:
+        return run_cmd(f"cd {INSTALL_DIR} && docker exec {PROJECT_NAME}-nginx nginx -s reload", check=False)
+    import docker_api
+    log(f"Docker API: exec {PROJECT_NAME}-nginx nginx -s reload", Colors.BLUE)
+    try:
+        result = client.exec(f"{PROJECT_NAME}-nginx", ["nginx", "-s", "reload"])
+    except docker_api.ERRORS as e:
+        warning(f"nginx -s reload: {e}")
+        return False
+    if result.exit_code != 0:
+        warning(f"nginx -s reload: {result.output.strip()}")
+    return result.exit_code == 0
+
+def show_containers():
+    """Состояние контейнеров проекта (аналог docker compose ps)"""
+    client = docker()
+    if client is None:
+        run_cmd(f"cd {INSTALL_DIR} && docker compose ps")
+        return
+    import docker_api
+    try:
+        containers = client.containers({"label": [f"com.docker.compose.project={PROJECT_NAME}"]})
+    except docker_api.ERRORS as e:
+        warning(f"Не удалось получить список контейнеров: {e}")
+        return
+    for c in containers:
+        color = Colors.GREEN if c.state == "running" and c.health != "unhealthy" else Colors.YELLOW
+        log(f"   {c.name:<28} {c.state:<10} {c.status}", color)
+
+def build_images():
+    """Собрать образы web, lead и rum через Docker API с живым логом (False - собирать через compose)"""
+    client = docker()
+    if client is None:
+        return False
+    import docker_api
+    for service, context in BUILD_CONTEXTS.items():
+        tag = f"{PROJECT_NAME}-{service}:latest"
+        log(f"Docker API: build {tag} ({context})", Colors.BLUE)
+        try:
+            for item in client.build(f"{INSTALL_DIR}/{context}", tag,
+                                     labels={"com.docker.compose.project": PROJECT_NAME}):
+                if item.get("stream"):
+                    print(item["stream"], end="", flush=True)
+        except docker_api.DockerError as e:
+            error(f"Сборка {tag} не удалась: {e.message}")
+        except docker_api.ERRORS as e:
+            warning(f"Docker API: сборка {tag} прервана ({e}), собираю через docker compose")
+            return False
+    return True
+
 def check_root():
     """Проверка root прав"""
     if os.geteuid() != 0:
@@ -151,6 +289,9 @@ def clone_website():
     run_cmd(f"rm -rf {temp_dir}", check=False)
     run_cmd(f"git clone https://github.com/KomarovAI/service.moscow.git {temp_dir}")
     run_cmd(f"cp -r {temp_dir}/src {INSTALL_DIR}/")
+    run_cmd(f"cp {temp_dir}/build.py {temp_dir}/docker_api.py {INSTALL_DIR}/")
+    run_cmd(f"rm -rf {INSTALL_DIR}/services", check=False)
+    run_cmd(f"cp -r {temp_dir}/services {INSTALL_DIR}/")
     run_cmd(f"rm -rf {temp_dir}")
     log("Исходники сайта получены!")
 
@@ -160,6 +301,7 @@ def write_docker_compose():
 
 services:
   web:
+    image: {PROJECT_NAME}-web:latest
     build:
       context: .
       dockerfile: Dockerfile
@@ -174,11 +316,68 @@ services:
       retries: 3
       start_period: 20s
 
+  lead:
+    image: {PROJECT_NAME}-lead:latest
+    build:
+      context: ./services/lead
+      dockerfile: Dockerfile
+    container_name: {PROJECT_NAME}-lead
+    restart: unless-stopped
+    networks:
+      - webnet
+    read_only: true
+    security_opt:
+      - no-new-privileges:true
+    tmpfs:
+      - /tmp
+    environment:
+      - LEAD_QUEUE_SIZE=10000
+      - LEAD_BATCH_SIZE=500
+    volumes:
+      - lead-data:/data:rw
+    # Ограничиваем память: очередь заявок ограничена LEAD_QUEUE_SIZE
+    mem_limit: 128m
+    healthcheck:
+      test: ["CMD", "wget", "-qO-", "http://localhost:8080/healthz"]
+      interval: 30s
+      timeout: 5s
+      retries: 3
+      start_period: 10s
+
+  rum:
+    image: {PROJECT_NAME}-rum:latest
+    build:
+      context: ./services/rum
+      dockerfile: Dockerfile
+    container_name: {PROJECT_NAME}-rum
+    restart: unless-stopped
+    networks:
+      - webnet
+    read_only: true
+    security_opt:
+      - no-new-privileges:true
+    tmpfs:
+      - /tmp
+    environment:
+      - RUM_FLUSH_INTERVAL=30
+      - RUM_RETENTION_DAYS=90
+    volumes:
+      - rum-data:/data:rw
+    mem_limit: 128m
+    healthcheck:
+      test: ["CMD", "wget", "-qO-", "http://localhost:8081/healthz"]
+      interval: 30s
+      timeout: 5s
+      retries: 3
+      start_period: 10s
+
   nginx:
     image: nginx:alpine
     container_name: {PROJECT_NAME}-nginx
     depends_on:
       - web
+      - lead
+      - rum
     restart: unless-stopped
     ports:
       - "80:80"
@@ -208,6 +407,8 @@ networks:
 
 volumes:
   certbot-webroot:
+  lead-data:
+  rum-data:
 '''
     
     with open(f"{INSTALL_DIR}/docker-compose.yml", "w") as f:
@@ -217,7 +418,8 @@ volumes:
 
 def write_nginx_config():
     """Создание конфигурации Nginx для HTTP (SSL добавим позже)"""
-    nginx_config = f'''server {{
+    nginx_config = f'''{API_UPSTREAMS}
+server {{
     listen 80;
     listen [::]:80;
     server_name {DOMAIN} www.{DOMAIN};
@@ -228,6 +430,7 @@ def write_nginx_config():
         try_files $uri =404;
     }}
 
+{API_LOCATIONS}
     # Основное проксирование на веб-контейнер
     location / {{
         proxy_pass http://{PROJECT_NAME}-web:80;
@@ -245,13 +448,23 @@ def write_nginx_config():
 
 def write_dockerfile():
     """Создание Dockerfile"""
-    dockerfile_content = '''FROM nginx:alpine
+    dockerfile_content = '''FROM python:3.12-alpine AS build
+
+WORKDIR /build
+
+COPY build.py ./
+COPY ./src/ ./src/
+
+RUN python build.py --src src --out dist --nginx-out dist-nginx
+
+FROM nginx:alpine
 
 WORKDIR /usr/share/nginx/html
 
 RUN rm -rf /usr/share/nginx/html/*
 
-COPY ./src/ /usr/share/nginx/html/
+COPY --from=build /build/dist/ /usr/share/nginx/html/
+COPY --from=build /build/dist-nginx/default.conf /etc/nginx/conf.d/default.conf
 
 EXPOSE 80
 
@@ -266,10 +479,14 @@ CMD ["nginx", "-g", "daemon off;"]
 def start_services():
     """Запуск сервисов"""
     log("Запускаю сервисы...")
-    run_cmd(f"cd {INSTALL_DIR} && docker compose up -d --build nginx web")
+    # Образы собираем через API с живым логом; compose только создаёт контейнеры
+    if build_images():
+        run_cmd(f"cd {INSTALL_DIR} && docker compose up -d --no-build nginx web lead rum")
+    else:
+        run_cmd(f"cd {INSTALL_DIR} && docker compose up -d --build nginx web lead rum")
     
     # Ждем запуска
-    time.sleep(10)
+    wait_for_services(["web", "lead", "rum", "nginx"])
     log("Сервисы запущены!")
 
 def obtain_ssl_certificate():
@@ -283,23 +500,35 @@ def obtain_ssl_certificate():
         warning("Сайт не отвечает по HTTP, но продолжаю...")
     
     # Получаем сертификат через отдельный Docker контейнер
-    cert_cmd = f'''docker run --rm \
-      --name certbot \
-      -v {INSTALL_DIR}/letsencrypt:/etc/letsencrypt \
-      -v service-moscow_certbot-webroot:/var/www/certbot \
-      certbot/certbot:latest \
-      certonly --agree-tos --no-eff-email \
-      --email {EMAIL} --webroot -w /var/www/certbot \
-      -d {DOMAIN} -d www.{DOMAIN}'''
-    
-    success = run_cmd(cert_cmd, check=False)
+    certbot_args = ["certonly", "--agree-tos", "--no-eff-email",
+                    "--email", EMAIL, "--webroot", "-w", "/var/www/certbot",
+                    "-d", DOMAIN, "-d", f"www.{DOMAIN}"]
+    certbot_binds = [f"{INSTALL_DIR}/letsencrypt:/etc/letsencrypt",
+                     "service-moscow_certbot-webroot:/var/www/certbot"]
+    
+    client = docker()
+    if client is not None:
+        import docker_api
+        log("Docker API: run certbot/certbot:latest " + " ".join(certbot_args), Colors.BLUE)
+        try:
+            result = client.run("certbot/certbot:latest", certbot_args,
+                                name="certbot", binds=certbot_binds)
+            print(result.output, end="")
+            success = result.exit_code == 0
+        except docker_api.ERRORS as e:
+            warning(f"certbot: {e}")
+            success = False
+    else:
+        binds = " ".join(f"-v {bind}" for bind in certbot_binds)
+        success = run_cmd(f"docker run --rm --name certbot {binds} certbot/certbot:latest "
+                          + " ".join(certbot_args), check=False)
     
     if success:
         log("SSL сертификат получен!")
         # Обновляем конфигурацию Nginx с SSL
         write_nginx_config_with_ssl()
         # Перезапускаем Nginx
-        run_cmd(f"cd {INSTALL_DIR} && docker exec {PROJECT_NAME}-nginx nginx -s reload")
+        reload_nginx()
         log("Nginx перезапущен с SSL!")
     else:
         warning("Не удалось получить SSL сертификат. Сайт работает по HTTP.")
@@ -309,7 +538,8 @@ def obtain_ssl_certificate():
 
 def write_nginx_config_with_ssl():
     """Создание полной конфигурации Nginx с SSL"""
-    nginx_config = f'''server {{
+    nginx_config = f'''{API_UPSTREAMS}
+server {{
     listen 80;
     listen [::]:80;
     server_name {DOMAIN} www.{DOMAIN};
@@ -346,7 +576,7 @@ server {{
     add_header X-Content-Type-Options "nosniff" always;
     add_header Referrer-Policy "no-referrer-when-downgrade" always;
     add_header X-XSS-Protection "1; mode=block" always;
-    add_header Content-Security-Policy "default-src 'self' 'unsafe-inline' 'unsafe-eval' data: blob:;" always;
+    add_header Content-Security-Policy "default-src 'self' 'unsafe-inline' 'unsafe-eval' data: blob: https://fonts.googleapis.com https://fonts.gstatic.com;" always;
 
     # Gzip сжатие
     gzip on;
@@ -371,6 +601,14 @@ server {{
         try_files $uri =404;
     }}
 
+{API_LOCATIONS}
+    # Cache-Control для sw.js ставит веб-контейнер; без add_header здесь
+    # наследуются security headers уровня server
+    location = /sw.js {{
+        proxy_pass http://{PROJECT_NAME}-web:80;
+        proxy_set_header Host $host;
+    }}
+
     location / {{
         proxy_pass http://{PROJECT_NAME}-web:80;
         proxy_set_header Host $host;
@@ -432,7 +670,7 @@ def check_health():
     log("Проверяю состояние сервисов...")
     
     # Проверяем контейнеры
-    run_cmd(f"cd {INSTALL_DIR} && docker compose ps")
+    show_containers()
     
     # Проверяем доступность сайта
     log("Проверяю доступность сайта...")
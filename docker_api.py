@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+Клиент Docker Engine API через /var/run/docker.sock
+Держит одно постоянное HTTP/1.1-соединение для коротких вызовов и открывает
+отдельное соединение под потоковые ответы (сборка, pull, события), чтобы
+логи и события читались построчно по мере поступления, без буферизации
+"""
+
+import os
+import json
+import time
+import socket
+import struct
+import tarfile
+import fnmatch
+import tempfile
+import http.client
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional
+from urllib.parse import quote, urlencode
+
+DOCKER_SOCKET = os.environ.get("DOCKER_SOCKET", "/var/run/docker.sock")
+# Старше этой версии API клиент не просит, даже если демон новее
+MAX_API_VERSION = "1.47"
+DEFAULT_TIMEOUT = 60
+
+
+class DockerError(Exception):
+    """Ошибка ответа Docker API (status - HTTP-код)"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+
+
+# Чем может закончиться любой вызов: ответ демона с ошибкой, сокет (в том числе
+# таймаут) или оборванный HTTP-обмен
+ERRORS = (DockerError, OSError, http.client.HTTPException)
+
+
+class ExecResult(NamedTuple):
+    exit_code: int
+    output: str
+
+
+class ContainerState(NamedTuple):
+    name: str
+    image: str
+    state: str
+    status: str
+    health: Optional[str]
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP-соединение поверх unix-сокета"""
+
+    def __init__(self, socket_path: str, timeout: Optional[float] = DEFAULT_TIMEOUT):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+def _version_tuple(version: str):
+    return tuple(int(part) for part in version.split("."))
+
+
+def _demux(data: bytes) -> str:
+    """Разобрать мультиплексированный поток stdout/stderr (контейнер без TTY)"""
+    out = []
+    offset = 0
+    while offset + 8 <= len(data):
+        _, size = struct.unpack(">BxxxL", data[offset:offset + 8])
+        out.append(data[offset + 8:offset + 8 + size])
+        offset += 8 + size
+    if offset == 0 and data:
+        return data.decode("utf-8", "replace")
+    return b"".join(out).decode("utf-8", "replace")
+
+
+def _dockerignore(context: Path) -> List[str]:
+    path = context / ".dockerignore"
+    if not path.exists():
+        return []
+    patterns = []
+    for line in path.read_text().splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            patterns.append(line.rstrip("/"))
+    return patterns
+
+
+def _ignored(rel: str, patterns: List[str]) -> bool:
+    ignored = False
+    for pattern in patterns:
+        negate = pattern.startswith("!")
+        pattern = pattern.lstrip("!")
+        if fnmatch.fnmatch(rel, pattern) or fnmatch.fnmatch(rel, pattern + "/*"):
+            ignored = not negate
+    return ignored
+
+
+def build_context(context: Path, dockerfile: str = "Dockerfile"):
+    """Упаковать контекст сборки в tar (во временный файл, не в память)"""
+    context = Path(context)
+    patterns = _dockerignore(context)
+    archive = tempfile.TemporaryFile()
+    with tarfile.open(fileobj=archive, mode="w") as tar:
+        for path in sorted(context.rglob("*")):
+            rel = path.relative_to(context).as_posix()
+            if rel != dockerfile and _ignored(rel, patterns):
+                continue
+            if path.is_file() or path.is_symlink():
+                tar.add(path, arcname=rel, recursive=False)
+    archive.seek(0)
+    return archive
+
+
+class DockerClient:
+    """Типизированные вызовы Docker Engine API"""
+
+    def __init__(self, socket_path: str = DOCKER_SOCKET, timeout: float = DEFAULT_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.conn = None
+        self.api_version = None
+
+    # Транспорт
+
+    def _connection(self, timeout=...):
+        return UnixHTTPConnection(self.socket_path,
+                                  self.timeout if timeout is ... else timeout)
+
+    def _url(self, path: str, params: Optional[dict] = None) -> str:
+        if self.api_version is None:
+            self.negotiate()
+        url = f"/v{self.api_version}{path}"
+        if params:
+            params = {k: (json.dumps(v) if isinstance(v, (dict, list)) else v)
+                      for k, v in params.items() if v is not None}
+            url += "?" + urlencode(params)
+        return url
+
+    def negotiate(self):
+        """Выбрать версию API: min(версия демона, MAX_API_VERSION)"""
+        response = self._send("GET", "/_ping")
+        response.read()
+        server = response.getheader("Api-Version") or MAX_API_VERSION
+        self.api_version = min(server, MAX_API_VERSION, key=_version_tuple)
+        return self.api_version
+
+    def _send(self, method, url, body=None, headers=None):
+        """Запрос по постоянному соединению; одна попытка переподключения"""
+        headers = dict(headers or {})
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = self._connection()
+            try:
+                self.conn.request(method, url, body=body, headers=headers)
+                return self.conn.getresponse()
+            except (http.client.RemoteDisconnected, BrokenPipeError,
+                    ConnectionResetError, http.client.CannotSendRequest):
+                self.close()
+                if attempt == 2:
+                    raise
+            except ERRORS:
+                # Например, таймаут посреди ответа: соединение больше не годится
+                self.close()
+                raise
+
+    def _call(self, method: str, path: str, params: Optional[dict] = None,
+              body=None, raw: bool = False):
+        response = self._send(method, self._url(path, params), body)
+        data = response.read()
+        if response.status >= 400:
+            raise DockerError(response.status, self._error_message(data))
+        if raw:
+            return data
+        if data and (response.getheader("Content-Type") or "").startswith("application/json"):
+            return json.loads(data)
+        return None
+
+    def _stream(self, method: str, path: str, params: Optional[dict] = None,
+                body=None, headers=None, timeout=None) -> Iterator[dict]:
+        """Потоковый ответ на отдельном соединении: по JSON-объекту на строку"""
+        conn = self._connection(timeout)
+        try:
+            conn.request(method, self._url(path, params), body=body, headers=headers or {})
+            response = conn.getresponse()
+            if response.status >= 400:
+                raise DockerError(response.status, self._error_message(response.read()))
+            while True:
+                line = response.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        finally:
+            conn.close()
+
+    def _hijacked(self, path: str, body: dict) -> bytes:
+        """Вызов, для которого демон захватывает соединение (exec start, attach):
+        ответ без длины до закрытия сокета, поэтому на отдельном соединении"""
+        conn = self._connection()
+        try:
+            conn.request("POST", self._url(path), body=json.dumps(body).encode("utf-8"),
+                         headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+            data = response.read()
+            if response.status >= 400:
+                raise DockerError(response.status, self._error_message(data))
+            return data
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _error_message(data: bytes) -> str:
+        try:
+            return json.loads(data).get("message", "")
+        except (ValueError, AttributeError):
+            return data.decode("utf-8", "replace").strip()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    # Система
+
+    def ping(self) -> bool:
+        response = self._send("GET", "/_ping")
+        return response.read() == b"OK"
+
+    def version(self) -> dict:
+        return self._call("GET", "/version")
+
+    # Образы
+
+    def build(self, context: str, tag: str, dockerfile: str = "Dockerfile",
+              labels: Optional[Dict[str, str]] = None, pull: bool = False) -> Iterator[dict]:
+        """Собрать образ; отдаёт строки лога сборки по мере поступления"""
+        params = {"t": tag, "dockerfile": dockerfile, "rm": 1,
+                  "labels": labels, "pull": 1 if pull else None}
+        with build_context(Path(context), dockerfile) as archive:
+            size = os.fstat(archive.fileno()).st_size
+            headers = {"Content-Type": "application/x-tar", "Content-Length": str(size)}
+            for item in self._stream("POST", "/build", params, archive, headers, timeout=None):
+                if "error" in item:
+                    raise DockerError(500, item["error"].strip())
+                yield item
+
+    def pull(self, image: str) -> Iterator[dict]:
+        name, _, tag = image.partition(":")
+        for item in self._stream("POST", "/images/create",
+                                 {"fromImage": name, "tag": tag or "latest"}, timeout=None):
+            if "error" in item:
+                raise DockerError(500, item["error"].strip())
+            yield item
+
+    def image_exists(self, image: str) -> bool:
+        try:
+            self._call("GET", f"/images/{quote(image, safe='')}/json")
+            return True
+        except DockerError as e:
+            if e.status == 404:
+                return False
+            raise
+
+    def prune_images(self, dangling_only: bool = True) -> dict:
+        filters = {"dangling": ["true" if dangling_only else "false"]}
+        return self._call("POST", "/images/prune", {"filters": filters})
+
+    # Контейнеры
+
+    def create(self, image: str, name: Optional[str] = None,
+               cmd: Optional[List[str]] = None, entrypoint: Optional[List[str]] = None,
+               binds: Optional[List[str]] = None, env: Optional[Dict[str, str]] = None,
+               labels: Optional[Dict[str, str]] = None, network: Optional[str] = None,
+               user: Optional[str] = None, auto_remove: bool = False) -> str:
+        """Создать контейнер, вернуть его id"""
+        config = {"Image": image, "Labels": labels or {},
+                  "HostConfig": {"Binds": binds or [], "AutoRemove": auto_remove}}
+        if cmd is not None:
+            config["Cmd"] = cmd
+        if entrypoint is not None:
+            config["Entrypoint"] = entrypoint
+        if env:
+            config["Env"] = [f"{k}={v}" for k, v in env.items()]
+        if user:
+            config["User"] = user
+        if network:
+            config["HostConfig"]["NetworkMode"] = network
+        result = self._call("POST", "/containers/create", {"name": name}, config)
+        return result["Id"]
+
+    def start(self, container: str):
+        self._call("POST", f"/containers/{quote(container)}/start")
+
+    def stop(self, container: str, timeout: int = 10):
+        self._call("POST", f"/containers/{quote(container)}/stop", {"t": timeout})
+
+    def remove(self, container: str, force: bool = False):
+        self._call("DELETE", f"/containers/{quote(container)}",
+                   {"force": 1 if force else None})
+
+    def wait(self, container: str) -> int:
+        """Дождаться завершения контейнера, вернуть код выхода"""
+        conn = self._connection(None)
+        try:
+            conn.request("POST", self._url(f"/containers/{quote(container)}/wait"))
+            response = conn.getresponse()
+            data = response.read()
+        finally:
+            conn.close()
+        if response.status >= 400:
+            raise DockerError(response.status, self._error_message(data))
+        return json.loads(data)["StatusCode"]
+
+    def logs(self, container: str, tail: Optional[int] = None) -> str:
+        data = self._call("GET", f"/containers/{quote(container)}/logs",
+                          {"stdout": 1, "stderr": 1, "tail": tail}, raw=True)
+        return _demux(data)
+
+    def inspect(self, container: str) -> dict:
+        return self._call("GET", f"/containers/{quote(container)}/json")
+
+    def containers(self, filters: Optional[Dict[str, List[str]]] = None,
+                   all: bool = True) -> List[ContainerState]:
+        """Список контейнеров (аналог docker ps / docker compose ps)"""
+        items = self._call("GET", "/containers/json",
+                           {"all": 1 if all else None, "filters": filters})
+        result = []
+        for item in items:
+            status = item.get("Status", "")
+            health = None
+            for value in ("healthy", "unhealthy", "starting"):
+                if f"({value}" in status or f"(health: {value}" in status:
+                    health = value
+            result.append(ContainerState(
+                name=(item.get("Names") or ["?"])[0].lstrip("/"),
+                image=item.get("Image", ""),
+                state=item.get("State", ""),
+                status=status,
+                health=health,
+            ))
+        return result
+
+    def prune_containers(self) -> dict:
+        return self._call("POST", "/containers/prune")
+
+    def exec(self, container: str, cmd: List[str], user: Optional[str] = None) -> ExecResult:
+        """Выполнить команду в контейнере (аналог docker exec)"""
+        config = {"Cmd": cmd, "AttachStdout": True, "AttachStderr": True}
+        if user:
+            config["User"] = user
+        exec_id = self._call("POST", f"/containers/{quote(container)}/exec", body=config)["Id"]
+        data = self._hijacked(f"/exec/{exec_id}/start", {"Detach": False, "Tty": False})
+        # Поток закрывается раньше, чем демон запишет код возврата: ждём, как docker CLI
+        deadline = time.time() + self.timeout
+        delay = 0.005
+        while True:
+            info = self._call("GET", f"/exec/{exec_id}/json")
+            if not info.get("Running") and info.get("ExitCode") is not None:
+                return ExecResult(info["ExitCode"], _demux(data))
+            if time.time() >= deadline:
+                raise DockerError(504, f"exec {exec_id[:12]} не завершился за {self.timeout} с")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.2)
+
+    def run(self, image: str, cmd: Optional[List[str]] = None, **kwargs) -> ExecResult:
+        """Создать, запустить и дождаться одноразовый контейнер (аналог docker run --rm)"""
+        if not self.image_exists(image):
+            for _ in self.pull(image):
+                pass
+        container = self.create(image, cmd=cmd, **kwargs)
+        try:
+            self.start(container)
+            exit_code = self.wait(container)
+            return ExecResult(exit_code, self.logs(container))
+        finally:
+            try:
+                self.remove(container, force=True)
+            except DockerError:
+                pass
+
+    # События и здоровье
+
+    def events(self, filters: Optional[Dict[str, List[str]]] = None,
+               since: Optional[float] = None, until: Optional[float] = None) -> Iterator[dict]:
+        """Поток событий демона; с until демон сам закрывает поток в срок"""
+        params = {"filters": filters,
+                  "since": f"{since:.3f}" if since is not None else None,
+                  "until": f"{until:.3f}" if until is not None else None}
+        return self._stream("GET", "/events", params, timeout=None)
+
+    def health(self, container: str) -> str:
+        """healthy / unhealthy / starting, либо состояние, если healthcheck нет"""
+        state = self.inspect(container)["State"]
+        if state.get("Health"):
+            return state["Health"]["Status"]
+        return state.get("Status", "unknown")
+
+    def wait_healthy(self, container: str, timeout: float = 120) -> str:
+        """Ждать healthy по событиям health_status вместо sleep"""
+        started = time.time()
+        state = self.inspect(container)["State"]
+        # Без healthcheck событий health_status не будет: возвращаем состояние как есть
+        # (running, created, restarting, exited...)
+        if not state.get("Health") or state.get("Status") in ("exited", "dead"):
+            return state.get("Status", "unknown")
+        if state["Health"]["Status"] != "starting":
+            return state["Health"]["Status"]
+        # События с момента до проверки: переход не потеряется между inspect и подпиской
+        events = self.events({"container": [container], "event": ["health_status"]},
+                             since=started - 1, until=started + timeout)
+        for event in events:
+            status = event.get("Action", event.get("status", "")).split(":", 1)[-1].strip()
+            if status in ("healthy", "unhealthy"):
+                events.close()
+                return status
+        return self.health(container)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def connect(socket_path: str = DOCKER_SOCKET) -> Optional[DockerClient]:
+    """Клиент, если сокет доступен и демон отвечает, иначе None"""
+    if not os.path.exists(socket_path):
+        return None
+    client = DockerClient(socket_path)
+    try:
+        client.negotiate()
+    except (OSError, http.client.HTTPException):
+        client.close()
+        return None
+    return client
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Сравнение накладных расходов: docker_api.py против docker CLI через shell
+На каждую операцию (inspect, ps, exec) берётся медиана N повторов.
+С --fake оба варианта идут в поддельный демон (scripts/fake_docker.py), так что
+измеряется чистая стоимость вызова, а не работа настоящего демона.
+Без docker CLI в PATH сравнивать не с чем: печатаются только времена API
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "scripts"))
+
+import docker_api  # noqa: E402
+
+
+def measure(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def shell(cmd, env):
+    """Так же, как run_cmd(..., capture=True) в deploy.py/update.py"""
+    subprocess.run(cmd, shell=True, check=True, capture_output=True, text=True, env=env)
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Накладные расходы Docker API против CLI")
+    parser.add_argument("--socket", default=docker_api.DOCKER_SOCKET, help="Сокет Docker")
+    parser.add_argument("--fake", action="store_true",
+                        help="Поднять поддельный демон на временном сокете")
+    parser.add_argument("--container", default="service-moscow-web",
+                        help="Контейнер для inspect/exec")
+    parser.add_argument("-n", "--repeats", type=int, default=50, help="Повторов на операцию")
+    args = parser.parse_args()
+
+    fake = None
+    socket_path = args.socket
+    if args.fake:
+        from fake_docker import FakeDockerServer
+        socket_path = os.path.join(tempfile.mkdtemp(), "docker.sock")
+        fake = FakeDockerServer(socket_path).start()
+
+    client = docker_api.connect(socket_path)
+    if client is None:
+        print(f"Docker API недоступен на {socket_path}")
+        sys.exit(1)
+
+    env = dict(os.environ, DOCKER_HOST=f"unix://{socket_path}")
+    docker_cli = shutil.which("docker")
+    c = args.container
+    operations = [
+        ("inspect", lambda: client.inspect(c), f"docker inspect {c}"),
+        ("ps", lambda: client.containers(), "docker ps -a"),
+        ("exec true", lambda: client.exec(c, ["true"]), f"docker exec {c} true"),
+    ]
+
+    print(f"Сокет: {socket_path}, повторов: {args.repeats} (медианы, мс)")
+    print(f"{'операция':<12}{'API':>10}{'CLI':>10}{'разница':>10}")
+    try:
+        for name, api_call, cli_cmd in operations:
+            api_ms = measure(api_call, args.repeats)
+            if docker_cli:
+                cli_ms = measure(lambda: shell(cli_cmd, env), args.repeats)
+                print(f"{name:<12}{api_ms:>10.2f}{cli_ms:>10.2f}{cli_ms / api_ms:>9.0f}x")
+            else:
+                print(f"{name:<12}{api_ms:>10.2f}{'-':>10}{'-':>10}")
+
+        if not docker_cli:
+            print("\ndocker CLI не найден: сравнение с CLI не выполнено")
+    finally:
+        client.close()
+        if fake is not None:
+            fake.stop()
+
+
+if __name__ == "__main__":
+    main()
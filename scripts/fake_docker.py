@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Поддельный Docker-демон на unix-сокете для проверки docker_api.py без Docker
+Отвечает на те вызовы Engine API, которыми пользуются deploy.py и update.py:
+ping, inspect, ps, exec, create/start/wait/logs, prune, pull, build и события
+health_status (контейнер становится healthy через HEALTHY_AFTER секунд)
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import struct
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler
+from socketserver import ThreadingUnixStreamServer
+from urllib.parse import urlparse, parse_qs
+
+API_VERSION = "1.45"
+HEALTHY_AFTER = 0.3
+# Сколько exec ещё числится Running после закрытия потока вывода (как у настоящего демона)
+EXEC_SETTLE = 0.005
+VERSION_PREFIX = re.compile(r"^/v\d+\.\d+")
+
+
+def frame(data, stream=1):
+    """Кадр мультиплексированного потока stdout/stderr"""
+    return struct.pack(">BxxxL", stream, len(data)) + data
+
+
+class FakeDocker:
+    """Состояние поддельного демона"""
+
+    def __init__(self, containers=("service-moscow-web", "service-moscow-nginx")):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.containers = {name: {"Id": f"{i:064x}", "Name": name, "Image": "nginx:alpine"}
+                           for i, name in enumerate(containers, 1)}
+        self.execs = {}
+        # Теги собранных образов по порядку
+        self.builds = []
+        self.counter = 100
+
+    def next_id(self):
+        with self.lock:
+            self.counter += 1
+            return f"{self.counter:064x}"
+
+    def find(self, ref):
+        for name, container in self.containers.items():
+            if ref in (name, container["Id"]) or container["Id"].startswith(ref):
+                return container
+        return None
+
+    def health(self, container):
+        if container.get("NoHealth"):
+            return None
+        return "healthy" if time.time() - self.started >= HEALTHY_AFTER else "starting"
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    docker = None
+
+    def log_message(self, format, *args):
+        pass
+
+    # Ответы
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Api-Version", API_VERSION)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_raw(self, body, content_type="application/vnd.docker.multiplexed-stream"):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def start_chunked(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def chunk(self, payload):
+        data = (json.dumps(payload) + "\r\n").encode() if payload is not None else b""
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def not_found(self, what):
+        self.send_json({"message": f"No such {what}"}, 404)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    # Маршрутизация
+
+    def handle_any(self, method):
+        url = urlparse(self.path)
+        path = VERSION_PREFIX.sub("", url.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        body = self.read_body()
+        docker = self.docker
+
+        if path == "/_ping":
+            self.send_response(200)
+            self.send_header("Api-Version", API_VERSION)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"OK")
+        elif path == "/version":
+            self.send_json({"Version": "fake", "ApiVersion": API_VERSION})
+        elif path == "/containers/json":
+            self.send_json([{
+                "Id": c["Id"], "Names": ["/" + c["Name"]], "Image": c["Image"],
+                "State": c.get("State", "running"),
+                "Status": "Up 1 minute" + (f" ({h})" if (h := docker.health(c)) else ""),
+            } for c in docker.containers.values()])
+        elif path == "/containers/create":
+            payload = json.loads(body or b"{}")
+            name = query.get("name") or f"fake_{docker.counter}"
+            docker.containers[name] = {"Id": docker.next_id(), "Name": name,
+                                       "Image": payload.get("Image", ""), "NoHealth": True,
+                                       "Cmd": payload.get("Cmd") or []}
+            self.send_json({"Id": docker.containers[name]["Id"], "Warnings": []}, 201)
+        elif path in ("/images/prune", "/containers/prune"):
+            self.send_json({"SpaceReclaimed": 0})
+        elif path == "/images/create":
+            self.start_chunked()
+            self.chunk({"status": f"Pulling from {query.get('fromImage')}"})
+            self.chunk({"status": "Download complete"})
+            self.chunk(None)
+        elif path == "/build":
+            docker.builds.append(query.get("t"))
+            self.start_chunked()
+            for step in range(1, 4):
+                self.chunk({"stream": f"Step {step}/3 : context {len(body)} bytes\n"})
+                time.sleep(0.01)
+            self.chunk({"aux": {"ID": "sha256:" + docker.next_id()}})
+            self.chunk({"stream": f"Successfully tagged {query.get('t')}\n"})
+            self.chunk(None)
+        elif path == "/events":
+            self.events(query)
+        elif (m := re.match(r"^/images/(.+)/json$", path)):
+            self.send_json({"Id": "sha256:" + "0" * 64, "RepoTags": [m.group(1)]})
+        elif (m := re.match(r"^/exec/(\w+)/(start|json)$", path)):
+            exec_id, action = m.groups()
+            if exec_id not in docker.execs:
+                return self.not_found("exec instance")
+            info = docker.execs[exec_id]
+            if action == "json":
+                running = info["finished"] is None or time.time() < info["finished"]
+                exit_code = 1 if info["cmd"][:1] == ["false"] else 0
+                return self.send_json({"ExitCode": None if running else exit_code,
+                                       "Running": running})
+            # Настоящий демон захватывает соединение: пишет статус и заголовок сам,
+            # без Content-Length и Connection: close, отдаёт вывод и закрывает сокет.
+            # docker CLI просит Upgrade: tcp и ждёт 101
+            if self.headers.get("Upgrade", "").lower() == "tcp":
+                self.wfile.write(b"HTTP/1.1 101 UPGRADED\r\n"
+                                 b"Content-Type: application/vnd.docker.raw-stream\r\n"
+                                 b"Connection: Upgrade\r\nUpgrade: tcp\r\n\r\n")
+            else:
+                self.wfile.write(b"HTTP/1.1 200 OK\r\n"
+                                 b"Content-Type: application/vnd.docker.raw-stream\r\n\r\n")
+            cmd = " ".join(info["cmd"])
+            self.wfile.write(frame(f"exec: {cmd}\n".encode()))
+            self.wfile.write(frame(b"done\n", stream=2))
+            self.wfile.flush()
+            info["finished"] = time.time() + EXEC_SETTLE
+            self.close_connection = True
+        elif (m := re.match(r"^/containers/([^/]+)(?:/(\w+))?$", path)):
+            ref, action = m.groups()
+            container = docker.find(ref)
+            if container is None:
+                return self.not_found(f"container: {ref}")
+            if method == "DELETE":
+                docker.containers.pop(container["Name"], None)
+                self.send_response(204)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            elif action == "json":
+                health = docker.health(container)
+                status = container.get("State", "running")
+                state = {"Status": status, "Running": status == "running"}
+                if health:
+                    state["Health"] = {"Status": health}
+                self.send_json({"Id": container["Id"], "Name": "/" + container["Name"],
+                                "State": state, "Config": {"Image": container["Image"]}})
+            elif action == "exec":
+                exec_id = docker.next_id()
+                docker.execs[exec_id] = {"cmd": json.loads(body or b"{}").get("Cmd", []),
+                                         "finished": None}
+                self.send_json({"Id": exec_id}, 201)
+            elif action in ("start", "stop"):
+                self.send_response(204)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            elif action == "wait":
+                self.send_json({"StatusCode": 0})
+            elif action == "logs":
+                cmd = " ".join(container.get("Cmd", []))
+                self.send_raw(frame(f"ran: {cmd}\n".encode()))
+            else:
+                self.not_found("endpoint")
+        else:
+            self.not_found("endpoint")
+
+    def events(self, query):
+        """health_status: healthy для контейнеров из фильтра, затем конец потока"""
+        filters = json.loads(query.get("filters") or "{}")
+        until = float(query["until"]) if "until" in query else None
+        self.start_chunked()
+        try:
+            self.stream_health(filters, until)
+        except (BrokenPipeError, ConnectionResetError):
+            # Клиент закрыл поток, дождавшись нужного события
+            self.close_connection = True
+
+    def stream_health(self, filters, until):
+        for name in filters.get("container", []):
+            container = self.docker.find(name)
+            if container is None:
+                continue
+            while self.docker.health(container) != "healthy":
+                if until is not None and time.time() >= until:
+                    break
+                time.sleep(0.02)
+            else:
+                self.chunk({"Type": "container", "Action": "health_status: healthy",
+                            "Actor": {"ID": container["Id"],
+                                      "Attributes": {"name": container["Name"]}},
+                            "time": int(time.time())})
+        self.chunk(None)
+
+    def do_GET(self):
+        self.handle_any("GET")
+
+    def do_POST(self):
+        self.handle_any("POST")
+
+    def do_DELETE(self):
+        self.handle_any("DELETE")
+
+
+class FakeDockerServer(ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, docker=None):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        handler = type("BoundHandler", (Handler,), {"docker": docker or FakeDocker()})
+        super().__init__(socket_path, handler)
+        self.socket_path = socket_path
+
+    def get_request(self):
+        # BaseHTTPRequestHandler ждёт адрес клиента в виде кортежа
+        request, _ = super().get_request()
+        return request, ("fake", 0)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Поддельный Docker-демон на unix-сокете")
+    parser.add_argument("socket", help="Путь к сокету, например /tmp/fake-docker.sock")
+    args = parser.parse_args()
+    server = FakeDockerServer(args.socket)
+    print(f"Fake Docker слушает {args.socket} (DOCKER_HOST=unix://{args.socket})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест сервиса приёма заявок (services/lead)
+Шлёт пачку заявок по keep-alive соединениям и печатает пропускную способность,
+задержки, коды ответов, метрики сервиса и пиковую память процесса
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import Counter
+from pathlib import Path
+
+SERVICE = Path(__file__).resolve().parent.parent / "services" / "lead" / "lead_service.py"
+
+
+def make_body(i):
+    lead = {
+        "name": f"Тест {i}",
+        "phone": f"+7 (9{i % 100:02d}) {i % 1000:03d}-{i % 100:02d}-{(i // 7) % 100:02d}",
+        "equipment": "parokonvektomat",
+        "description": "Не греет камера, ошибка E34",
+        "form": "quote-form",
+        "page": "/",
+    }
+    return json.dumps(lead, ensure_ascii=False).encode("utf-8")
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n")[1:]:
+        key, _, value = line.partition(b":")
+        if key.strip().lower() == b"content-length":
+            length = int(value)
+    body = await reader.readexactly(length) if length else b""
+    return status, body
+
+
+async def worker(host, port, counter, total, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while True:
+            i = counter[0]
+            if i >= total:
+                break
+            counter[0] += 1
+            body = make_body(i)
+            request = (
+                f"POST /api/lead HTTP/1.1\r\nHost: {host}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n"
+            ).encode("latin-1") + body
+            started = time.perf_counter()
+            writer.write(request)
+            status, _ = await read_response(reader)
+            latencies.append(time.perf_counter() - started)
+            statuses[status] += 1
+    finally:
+        writer.close()
+
+
+async def fetch_metrics(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET /metrics HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    _, body = await read_response(reader)
+    writer.close()
+    return body.decode("utf-8")
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(len(values) * p / 100))
+    return values[index]
+
+
+def peak_rss_kb(pid):
+    """Пиковая резидентная память процесса (Linux)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+async def wait_port(host, port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError(f"Сервис не поднялся на {host}:{port}")
+
+
+async def run(args):
+    process = None
+    tmpdir = None
+    if args.spawn:
+        tmpdir = tempfile.TemporaryDirectory()
+        process = subprocess.Popen([
+            sys.executable, str(SERVICE), "--host", args.host,
+            "--port", str(args.port), "--db", os.path.join(tmpdir.name, "leads.db"),
+            "--queue-size", str(args.queue_size),
+        ])
+        await wait_port(args.host, args.port)
+
+    try:
+        counter = [0]
+        latencies = []
+        statuses = Counter()
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            worker(args.host, args.port, counter, args.requests, latencies, statuses)
+            for _ in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+
+        print(f"Заявок:        {args.requests} за {elapsed:.2f} с")
+        print(f"Пропускная:    {args.requests / elapsed:.0f} заявок/с")
+        print(f"Задержка p50:  {percentile(latencies, 50) * 1000:.1f} мс")
+        print(f"Задержка p95:  {percentile(latencies, 95) * 1000:.1f} мс")
+        print(f"Задержка p99:  {percentile(latencies, 99) * 1000:.1f} мс")
+        print(f"Коды ответов:  {dict(sorted(statuses.items()))}")
+        print()
+        print(await fetch_metrics(args.host, args.port), end="")
+        if process is not None:
+            rss = peak_rss_kb(process.pid)
+            if rss is not None:
+                print(f"\nПиковая память сервиса: {rss / 1024:.1f} МБ")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Нагрузочный тест сервиса заявок")
+    parser.add_argument("--host", default="127.0.0.1", help="Адрес сервиса")
+    parser.add_argument("--port", type=int, default=8080, help="Порт сервиса")
+    parser.add_argument("--requests", type=int, default=20000, help="Всего заявок")
+    parser.add_argument("--concurrency", type=int, default=200,
+                        help="Одновременных соединений")
+    parser.add_argument("--spawn", action="store_true",
+                        help="Запустить сервис локально с временной БД")
+    parser.add_argument("--queue-size", type=int, default=10000,
+                        help="Размер очереди для --spawn")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
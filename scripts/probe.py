@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Пробер скорости загрузки сайта в реальном браузере (Playwright + Chromium)
+Сравнивает холодный и повторные визиты с service worker и без него,
+а с --compare-hints — холодную первую отрисовку с заголовками Link
+(preload/preconnect из build.py) и без них; сеть можно эмулировать.
+
+Установка: pip install playwright && python -m playwright install chromium
+"""
+
+import io
+import re
+import sys
+import gzip
+import json
+import time
+import argparse
+import threading
+import statistics
+from functools import partial
+from pathlib import Path
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from urllib.parse import urlparse
+
+try:
+    from playwright.sync_api import sync_playwright
+except ImportError:
+    sync_playwright = None
+
+ROOT = Path(__file__).resolve().parent.parent
+# Конфигурация edge nginx: оттуда берётся Content-Security-Policy для HTML
+EDGE_CONF = ROOT / "nginx" / "conf.d" / "site.conf"
+CSP_RE = re.compile(r'add_header\s+Content-Security-Policy\s+"([^"]+)"')
+STATIC_SUFFIXES = (".jpg", ".jpeg", ".gif", ".png", ".ico", ".svg", ".css", ".js",
+                   ".woff", ".woff2", ".ttf", ".eot")
+# Типы, которые edge nginx сжимает (gzip_types + text/html всегда), уровень gzip_comp_level
+GZIP_TYPES = {"text/html", "text/plain", "text/css", "text/xml", "text/javascript",
+              "application/javascript", "application/json", "image/svg+xml"}
+GZIP_LEVEL = 6
+
+# Профили сети для эмуляции через CDP: задержка (мс), скорость (кбит/с)
+NETWORKS = {
+    "none": None,
+    "4g": (80, 9000, 9000),
+    "3g": (300, 1600, 750),
+    "kitchen": (600, 400, 200),
+}
+
+# Метрики страницы после загрузки, все времена от начала навигации
+COLLECT_JS = """
+() => {
+    const nav = performance.getEntriesByType('navigation')[0];
+    const fp = performance.getEntriesByName('first-paint')[0];
+    const fcp = performance.getEntriesByName('first-contentful-paint')[0];
+    const resources = performance.getEntriesByType('resource');
+    const transferred = resources.reduce((sum, r) => sum + (r.transferSize || 0), 0)
+        + (nav ? nav.transferSize : 0);
+    const fromNetwork = resources.filter(r => r.transferSize > 0).length
+        + (nav && nav.transferSize > 0 ? 1 : 0);
+    return {
+        ttfb: nav ? nav.responseStart : null,
+        fp: fp ? fp.startTime : null,
+        fcp: fcp ? fcp.startTime : null,
+        dcl: nav ? nav.domContentLoadedEventEnd : null,
+        load: nav ? nav.loadEventEnd : null,
+        bytes: transferred,
+        requests: fromNetwork,
+        controlled: !!(navigator.serviceWorker && navigator.serviceWorker.controller)
+    };
+}
+"""
+
+
+class StaticHandler(SimpleHTTPRequestHandler):
+    """Раздаёт сборку с теми же заголовками и сжатием, что и edge nginx"""
+
+    # Страница -> заголовок Link (dist-nginx/preload-hints.json)
+    hints = {}
+    send_hints = False
+    # Заголовок CSP edge nginx (у статики его нет: свой add_header в location,
+    # а sw.js проксируется без своих заголовков и получает его)
+    csp = None
+    # Задержка всего ответа на HTML, до заголовков: имитирует думающий upstream
+    html_delay = 0.0
+
+    def send_head(self):
+        path = urlparse(self.path).path
+        if self.html_delay and path.endswith(("/", ".html")):
+            time.sleep(self.html_delay)
+        fs_path = Path(self.translate_path(self.path))
+        if path.endswith("/") and fs_path.is_dir():
+            fs_path = fs_path / "index.html"
+        ctype = self.guess_type(str(fs_path))
+        if (not fs_path.is_file() or ctype not in GZIP_TYPES
+                or "gzip" not in self.headers.get("Accept-Encoding", "")):
+            return super().send_head()
+        body = gzip.compress(fs_path.read_bytes(), compresslevel=GZIP_LEVEL)
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        return io.BytesIO(body)
+
+    def end_headers(self):
+        path = urlparse(self.path).path
+        if path == "/sw.js":
+            self.send_header("Cache-Control", "no-cache")
+        elif path.endswith(STATIC_SUFFIXES):
+            self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+        if self.csp and (path == "/sw.js" or not path.endswith(STATIC_SUFFIXES)):
+            self.send_header("Content-Security-Policy", self.csp)
+        if self.send_hints:
+            page = path[:-len("index.html")] if path.endswith("/index.html") else path
+            if page in self.hints:
+                self.send_header("Link", self.hints[page])
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def edge_csp(conf=EDGE_CONF):
+    """Content-Security-Policy из конфигурации edge nginx"""
+    match = CSP_RE.search(conf.read_text(encoding="utf-8")) if conf.is_file() else None
+    return match.group(1) if match else None
+
+
+def serve_dir(directory):
+    handler = partial(StaticHandler, directory=str(directory))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def emulate_network(context, page, profile):
+    if profile is None:
+        return
+    latency, down_kbps, up_kbps = profile
+    session = context.new_cdp_session(page)
+    session.send("Network.enable")
+    session.send("Network.emulateNetworkConditions", {
+        "offline": False,
+        "latency": latency,
+        "downloadThroughput": down_kbps * 1024 / 8,
+        "uploadThroughput": up_kbps * 1024 / 8,
+    })
+
+
+def visit(page, url):
+    page.goto(url, wait_until="load")
+    # loadEventEnd заполняется после выхода из обработчика load
+    page.wait_for_function(
+        "() => performance.getEntriesByType('navigation')[0].loadEventEnd > 0")
+    return page.evaluate(COLLECT_JS)
+
+
+def run_mode(browser, url, service_workers, repeats, profile, same_origin_only):
+    """Холодный визит + N повторных в одном профиле браузера"""
+    context = browser.new_context(service_workers=service_workers)
+    if same_origin_only:
+        origin = "{0.scheme}://{0.netloc}".format(urlparse(url))
+        context.route("**/*", lambda route: route.continue_()
+                      if route.request.url.startswith(origin) else route.abort())
+    page = context.new_page()
+    emulate_network(context, page, profile)
+
+    cold = visit(page, url)
+    if service_workers == "allow":
+        # Даём service worker'у установиться и взять страницу под контроль
+        page.evaluate("() => navigator.serviceWorker.ready.then(() => true)")
+        page.wait_for_function("() => !!navigator.serviceWorker.controller", timeout=30000)
+
+    repeat = [visit(page, url) for _ in range(repeats)]
+
+    offline = None
+    if service_workers == "allow":
+        context.set_offline(True)
+        try:
+            page.goto(url, wait_until="load")
+            offline = page.title()
+        except Exception as e:
+            offline = f"ошибка: {e.__class__.__name__}"
+        context.set_offline(False)
+
+    context.close()
+    return cold, repeat, offline
+
+
+def run_cold(browser, url, runs, profile, same_origin_only):
+    """Холодные визиты в чистых профилях без service worker"""
+    results = []
+    for _ in range(runs):
+        context = browser.new_context(service_workers="block")
+        if same_origin_only:
+            origin = "{0.scheme}://{0.netloc}".format(urlparse(url))
+            context.route("**/*", lambda route: route.continue_()
+                          if route.request.url.startswith(origin) else route.abort())
+        page = context.new_page()
+        emulate_network(context, page, profile)
+        results.append(visit(page, url))
+        context.close()
+    return results
+
+
+def compare_hints(browser, url, runs, profile):
+    """Первая отрисовка с заголовками Link и без них"""
+    rows = []
+    for name, enabled in (("без Link", False), ("с Link", True)):
+        StaticHandler.send_hints = enabled
+        # Внешние запросы не блокируем: куда можно ходить, решает CSP edge nginx,
+        # как и в продакшене (те же источники build.py берёт из CSP_ORIGINS)
+        results = run_cold(browser, url, runs, profile, False)
+        row = {"mode": name}
+        for key in ("ttfb", "fp", "fcp", "dcl", "load"):
+            row[key] = median([r[key] for r in results])
+        rows.append(row)
+    StaticHandler.send_hints = False
+    return rows
+
+
+def median(values):
+    values = [v for v in values if v is not None]
+    return statistics.median(values) if values else None
+
+
+def fmt_ms(value):
+    return "-" if value is None else f"{value:.0f} мс"
+
+
+def summarize(name, cold, repeat):
+    row = {"mode": name, "cold": cold}
+    for key in ("ttfb", "fcp", "dcl", "load", "bytes", "requests"):
+        row[key] = median([r[key] for r in repeat])
+    row["controlled"] = all(r["controlled"] for r in repeat)
+    return row
+
+
+def print_table(rows):
+    print(f"{'режим':<12}{'холодный load':>15}{'повтор FCP':>13}{'повтор load':>13}"
+          f"{'байт':>10}{'запросов':>10}")
+    for row in rows:
+        print(f"{row['mode']:<12}{fmt_ms(row['cold']['load']):>15}{fmt_ms(row['fcp']):>13}"
+              f"{fmt_ms(row['load']):>13}{row['bytes']:>10.0f}{row['requests']:>10.0f}")
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Пробер скорости загрузки сайта")
+    parser.add_argument("--url", help="Адрес страницы (например, https://artur789298.work.gd/)")
+    parser.add_argument("--serve", help="Раздать локальный каталог сборки (например, dist)")
+    parser.add_argument("--page", default="/", help="Страница при --serve")
+    parser.add_argument("--repeats", type=int, default=5, help="Повторных визитов")
+    parser.add_argument("--network", choices=sorted(NETWORKS), default="3g",
+                        help="Эмуляция сети")
+    parser.add_argument("--compare-hints", action="store_true",
+                        help="Сравнить холодную первую отрисовку с Link-заголовками и без")
+    parser.add_argument("--hints", default="dist-nginx/preload-hints.json",
+                        help="Заголовки Link по страницам (генерирует build.py)")
+    parser.add_argument("--html-delay", type=float, default=0,
+                        help="Задержка ответа на HTML до заголовков, мс (только --serve)")
+    parser.add_argument("--json", action="store_true", help="Вывод в JSON")
+    args = parser.parse_args()
+
+    if sync_playwright is None:
+        print("Нужен Playwright: pip install playwright && python -m playwright install chromium")
+        sys.exit(1)
+    if not args.url and not args.serve:
+        parser.error("укажите --url или --serve")
+    if args.compare_hints and not args.serve:
+        parser.error("--compare-hints работает только с --serve")
+
+    server = None
+    url = args.url
+    if args.serve:
+        server, base = serve_dir(ROOT / args.serve if not Path(args.serve).is_absolute()
+                                 else args.serve)
+        url = base.rstrip("/") + args.page
+        StaticHandler.html_delay = args.html_delay / 1000
+        StaticHandler.csp = edge_csp()
+        if args.compare_hints:
+            hints_path = Path(args.hints)
+            StaticHandler.hints = json.loads(
+                (hints_path if hints_path.is_absolute() else ROOT / hints_path).read_text())
+
+    profile = NETWORKS[args.network]
+    rows = []
+    try:
+        with sync_playwright() as p:
+            browser = p.chromium.launch()
+            if args.compare_hints:
+                rows = compare_hints(browser, url, args.repeats, profile)
+            else:
+                for name, sw in (("без SW", "block"), ("с SW", "allow")):
+                    cold, repeat, offline = run_mode(browser, url, sw, args.repeats,
+                                                     profile, bool(args.serve))
+                    row = summarize(name, cold, repeat)
+                    row["offline"] = offline
+                    rows.append(row)
+            browser.close()
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{url}, сеть: {args.network}, повторов: {args.repeats} (медианы)")
+    if args.compare_hints:
+        print(f"{'режим':<12}{'TTFB':>10}{'first paint':>14}{'FCP':>10}{'load':>10}")
+        for row in rows:
+            print(f"{row['mode']:<12}{fmt_ms(row['ttfb']):>10}{fmt_ms(row['fp']):>14}"
+                  f"{fmt_ms(row['fcp']):>10}{fmt_ms(row['load']):>10}")
+        base, hinted = rows
+        if base["fp"] and hinted["fp"]:
+            print(f"Первая отрисовка с Link быстрее на {base['fp'] - hinted['fp']:.0f} мс")
+        return
+    print_table(rows)
+    base, with_sw = rows
+    if base["load"] and with_sw["load"]:
+        gain = (1 - with_sw["load"] / base["load"]) * 100
+        print(f"Повторный визит с SW быстрее на {gain:.0f}%")
+    if with_sw["offline"]:
+        print(f"Офлайн с SW открывается: {with_sw['offline']}")
+
+
+if __name__ == "__main__":
+    main()
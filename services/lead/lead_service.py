@@ -0,0 +1,505 @@
+#!/usr/bin/env python3
+"""
+Сервис приёма заявок с форм сайта (/api/lead)
+Асинхронно принимает заявки, складывает их в ограниченную очередь в памяти
+и пачками (group commit) записывает в SQLite в режиме WAL
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import signal
+import asyncio
+import sqlite3
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+# Конфигурация (переопределяется переменными окружения)
+HOST = os.environ.get("LEAD_HOST", "0.0.0.0")
+PORT = int(os.environ.get("LEAD_PORT", "8080"))
+DB_PATH = os.environ.get("LEAD_DB_PATH", "/data/leads.db")
+QUEUE_SIZE = int(os.environ.get("LEAD_QUEUE_SIZE", "10000"))
+BATCH_SIZE = int(os.environ.get("LEAD_BATCH_SIZE", "500"))
+BATCH_LINGER_MS = float(os.environ.get("LEAD_BATCH_LINGER_MS", "2"))
+
+MAX_BODY = 16 * 1024
+MAX_HEADERS = 8 * 1024
+IDLE_TIMEOUT = 30
+# Docker шлёт SIGKILL через 10 с после SIGTERM: остановка должна уложиться в это время
+SHUTDOWN_TIMEOUT = 5
+DRAIN_TIMEOUT = 3
+RATE_WINDOW = 10.0
+
+# Допустимые поля формы и их максимальная длина
+OPTIONAL_FIELDS = {
+    "email": 254,
+    "equipment": 64,
+    "description": 2000,
+    "message": 2000,
+    "form": 64,
+    "page": 256,
+}
+
+EMAIL_RE = re.compile(r"^[^\s@]+@[^\s@]+\.[^\s@]+$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    received_at REAL NOT NULL,
+    name TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    email TEXT,
+    equipment TEXT,
+    description TEXT,
+    message TEXT,
+    form TEXT,
+    page TEXT,
+    ip TEXT
+)
+"""
+
+INSERT = """
+INSERT INTO leads (received_at, name, phone, email, equipment, description,
+                   message, form, page, ip)
+VALUES (:received_at, :name, :phone, :email, :equipment, :description,
+        :message, :form, :page, :ip)
+"""
+
+REASONS = {
+    200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request",
+    404: "Not Found", 405: "Method Not Allowed", 411: "Length Required",
+    413: "Payload Too Large", 415: "Unsupported Media Type",
+    500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+class ValidationError(Exception):
+    """Ошибка валидации заявки; fields - словарь поле -> сообщение"""
+
+    def __init__(self, fields):
+        super().__init__(", ".join(fields))
+        self.fields = fields
+
+
+def normalize_phone(phone):
+    """Привести российский номер к виду 7XXXXXXXXXX; иначе None (строже Utils.isValidPhone)"""
+    digits = re.sub(r"\D", "", phone or "")
+    if len(digits) == 10:
+        digits = "7" + digits
+    if len(digits) != 11 or digits[0] not in "78":
+        return None
+    return "7" + digits[1:]
+
+
+def validate_lead(data):
+    """Проверить и нормализовать заявку, вернуть словарь для записи в БД"""
+    errors = {}
+
+    name = str(data.get("name") or "").strip()
+    if len(name) < 2 or len(name) > 100:
+        errors["name"] = "Введите корректное имя"
+
+    phone = normalize_phone(str(data.get("phone") or ""))
+    if phone is None:
+        errors["phone"] = "Введите корректный номер телефона"
+
+    lead = {"name": name, "phone": phone}
+    for field, limit in OPTIONAL_FIELDS.items():
+        value = str(data.get(field) or "").strip()
+        lead[field] = value[:limit] or None
+
+    if lead["email"] and not EMAIL_RE.match(lead["email"]):
+        errors["email"] = "Введите корректный email"
+
+    if errors:
+        raise ValidationError(errors)
+    return lead
+
+
+class LeadStore:
+    """Запись заявок в SQLite; все вызовы идут из одного потока писателя"""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, isolation_level=None,
+                                    check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # FULL в WAL - fsync на каждый коммит; пачки амортизируют его стоимость
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.execute(SCHEMA)
+
+    def write_batch(self, rows):
+        """Записать пачку заявок одной транзакцией"""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.executemany(INSERT, rows)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.conn.close()
+            self.conn = None
+
+
+class Metrics:
+    """Счётчики сервиса и скорость записи за скользящее окно"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.accepted = 0
+        self.invalid = 0
+        self.rejected_full = 0
+        self.committed = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.last_commit_ms = 0.0
+        self.samples = deque()
+
+    def record_batch(self, size, duration):
+        now = time.monotonic()
+        self.committed += size
+        self.batches += 1
+        self.last_batch_size = size
+        self.last_commit_ms = duration * 1000
+        self.samples.append((now, self.committed))
+        while self.samples and now - self.samples[0][0] > RATE_WINDOW:
+            self.samples.popleft()
+
+    def commit_rate(self):
+        """Заявок в секунду за последние RATE_WINDOW секунд"""
+        if not self.samples:
+            return 0.0
+        now = time.monotonic()
+        first_time, first_total = self.samples[0]
+        if now - first_time > RATE_WINDOW:
+            return 0.0
+        span = max(now - first_time, 1.0)
+        return (self.committed - first_total) / span
+
+    def render(self, queue_depth, queue_size):
+        """Метрики в текстовом формате Prometheus"""
+        lines = [
+            ("lead_accepted_total", "counter", self.accepted),
+            ("lead_invalid_total", "counter", self.invalid),
+            ("lead_rejected_queue_full_total", "counter", self.rejected_full),
+            ("lead_committed_total", "counter", self.committed),
+            ("lead_failed_total", "counter", self.failed),
+            ("lead_batches_total", "counter", self.batches),
+            ("lead_last_batch_size", "gauge", self.last_batch_size),
+            ("lead_last_commit_ms", "gauge", round(self.last_commit_ms, 3)),
+            ("lead_commit_rate", "gauge", round(self.commit_rate(), 2)),
+            ("lead_queue_depth", "gauge", queue_depth),
+            ("lead_queue_capacity", "gauge", queue_size),
+            ("lead_uptime_seconds", "gauge", round(time.time() - self.started, 1)),
+        ]
+        out = []
+        for name, kind, value in lines:
+            out.append(f"# TYPE {name} {kind}")
+            out.append(f"{name} {value}")
+        return "\n".join(out) + "\n"
+
+
+class LeadService:
+    """HTTP-сервер на asyncio с групповой записью заявок"""
+
+    def __init__(self, db_path=DB_PATH, queue_size=QUEUE_SIZE,
+                 batch_size=BATCH_SIZE, linger_ms=BATCH_LINGER_MS):
+        self.store = LeadStore(db_path)
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.linger = linger_ms / 1000
+        self.metrics = Metrics()
+        self.queue = None
+        self.server = None
+        # Задача соединения -> writer; busy - те, что сейчас обрабатывают запрос
+        self.connections = {}
+        self.busy = set()
+        self.closing = False
+        self.writer_task = None
+        # Один поток: SQLite-соединение используется строго последовательно
+        self.executor = ThreadPoolExecutor(max_workers=1,
+                                           thread_name_prefix="lead-writer")
+
+    async def start(self, host=HOST, port=PORT):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.store.open)
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.writer_task = asyncio.create_task(self._writer())
+        self.server = await asyncio.start_server(
+            self._handle_connection, host, port, limit=MAX_HEADERS)
+        return self.server
+
+    async def stop(self):
+        """Перестать принимать заявки, дописать очередь и закрыть БД"""
+        self.closing = True
+        if self.server is not None:
+            self.server.close()
+        await self._close_connections()
+        if self.server is not None:
+            # С Python 3.12 wait_closed ждёт все соединения - они уже закрыты
+            try:
+                await asyncio.wait_for(self.server.wait_closed(), 1)
+            except asyncio.TimeoutError:
+                pass
+        if self.queue is not None:
+            try:
+                await asyncio.wait_for(self.queue.join(), DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"[LEAD] Не дописано заявок: {self.queue.qsize()}", file=sys.stderr)
+        if self.writer_task is not None:
+            self.writer_task.cancel()
+            try:
+                await self.writer_task
+            except asyncio.CancelledError:
+                pass
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.store.close)
+        self.executor.shutdown()
+
+    async def _close_connections(self):
+        """Закрыть простаивающие keep-alive соединения, дать занятым ответить"""
+        for task, writer in list(self.connections.items()):
+            if task not in self.busy:
+                writer.close()
+        if self.connections:
+            _, pending = await asyncio.wait(list(self.connections), timeout=SHUTDOWN_TIMEOUT)
+            for task in pending:
+                task.cancel()
+
+    async def submit(self, lead):
+        """Поставить заявку в очередь и дождаться её коммита"""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((lead, future))
+        self.metrics.accepted += 1
+        await future
+
+    async def _writer(self):
+        """Забирает накопившиеся заявки и пишет их одной транзакцией"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            if self.linger and self.queue.empty():
+                await asyncio.sleep(self.linger)
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            rows = [lead for lead, _ in batch]
+            started = time.monotonic()
+            try:
+                await loop.run_in_executor(self.executor,
+                                           self.store.write_batch, rows)
+            except Exception as e:
+                self.metrics.failed += len(batch)
+                print(f"[LEAD] Ошибка записи пачки из {len(batch)}: {e}",
+                      file=sys.stderr)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                self.metrics.record_batch(len(batch), time.monotonic() - started)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _handle_connection(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        peer_ip = peer[0] if isinstance(peer, tuple) else None
+        task = asyncio.current_task()
+        self.connections[task] = writer
+        try:
+            while not self.closing:
+                try:
+                    head = await asyncio.wait_for(
+                        reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError,
+                        ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._respond(writer, 400, {"error": "headers too large"},
+                                        keep_alive=False)
+                    break
+
+                request = self._parse_head(head)
+                if request is None:
+                    await self._respond(writer, 400, {"error": "bad request"},
+                                        keep_alive=False)
+                    break
+                method, path, headers, keep_alive = request
+                self.busy.add(task)
+
+                body = b""
+                length = headers.get("content-length")
+                if "transfer-encoding" in headers:
+                    await self._respond(writer, 411, {"error": "length required"},
+                                        keep_alive=False)
+                    break
+                if length is not None:
+                    if not length.isdigit():
+                        await self._respond(writer, 400, {"error": "bad length"},
+                                            keep_alive=False)
+                        break
+                    if int(length) > MAX_BODY:
+                        await self._respond(writer, 413, {"error": "too large"},
+                                            keep_alive=False)
+                        break
+                    body = await reader.readexactly(int(length))
+
+                ip = headers.get("x-real-ip") or peer_ip
+                status, payload, extra = await self._route(
+                    method, path, headers, body, ip)
+                # При остановке новых запросов по этому соединению не ждём
+                keep_alive = keep_alive and not self.closing
+                await self._respond(writer, status, payload, keep_alive, extra)
+                self.busy.discard(task)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.connections.pop(task, None)
+            self.busy.discard(task)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    @staticmethod
+    def _parse_head(head):
+        try:
+            lines = head.decode("latin-1").split("\r\n")
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            return None
+        headers = {}
+        for line in lines[1:]:
+            if not line:
+                continue
+            key, sep, value = line.partition(":")
+            if not sep:
+                return None
+            headers[key.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.1":
+            keep_alive = connection != "close"
+        else:
+            keep_alive = connection == "keep-alive"
+        path = target.split("?", 1)[0]
+        return method.upper(), path, headers, keep_alive
+
+    async def _route(self, method, path, headers, body, ip):
+        if path == "/api/lead":
+            if method != "POST":
+                return 405, {"error": "method not allowed"}, {"Allow": "POST"}
+            return await self._handle_lead(headers, body, ip)
+        if path == "/metrics" and method == "GET":
+            text = self.metrics.render(self.queue.qsize(), self.queue_size)
+            return 200, text, {}
+        if path == "/healthz" and method == "GET":
+            return 200, {"status": "ok", "queue": self.queue.qsize()}, {}
+        return 404, {"error": "not found"}, {}
+
+    async def _handle_lead(self, headers, body, ip):
+        content_type = headers.get("content-type", "").split(";")[0].strip()
+        try:
+            if content_type == "application/json":
+                data = json.loads(body.decode("utf-8"))
+                if not isinstance(data, dict):
+                    raise ValueError("expected object")
+            elif content_type == "application/x-www-form-urlencoded":
+                data = dict(parse_qsl(body.decode("utf-8")))
+            else:
+                return 415, {"error": "unsupported content type"}, {}
+        except (ValueError, UnicodeDecodeError):
+            return 400, {"error": "bad body"}, {}
+
+        try:
+            lead = validate_lead(data)
+        except ValidationError as e:
+            self.metrics.invalid += 1
+            return 400, {"error": "validation", "fields": e.fields}, {}
+
+        lead["received_at"] = time.time()
+        lead["ip"] = ip
+        try:
+            await self.submit(lead)
+        except asyncio.QueueFull:
+            self.metrics.rejected_full += 1
+            return 503, {"error": "busy"}, {"Retry-After": "1"}
+        except Exception:
+            return 500, {"error": "storage"}, {}
+        return 201, {"status": "ok"}, {}
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive=True, extra=None):
+        if isinstance(payload, str):
+            body = payload.encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            content_type = "application/json; charset=utf-8"
+        head = [
+            f"HTTP/1.1 {status} {REASONS.get(status, 'Unknown')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            "Cache-Control: no-store",
+            "Connection: " + ("keep-alive" if keep_alive else "close"),
+        ]
+        for key, value in (extra or {}).items():
+            head.append(f"{key}: {value}")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve(args):
+    service = LeadService(args.db, args.queue_size, args.batch_size,
+                          args.linger_ms)
+    await service.start(args.host, args.port)
+    print(f"[LEAD] Слушаю {args.host}:{args.port}, БД: {args.db}", flush=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    print("[LEAD] Останавливаюсь, дописываю очередь...", flush=True)
+    await service.stop()
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Сервис приёма заявок с сайта")
+    parser.add_argument("--host", default=HOST, help="Адрес для прослушивания")
+    parser.add_argument("--port", type=int, default=PORT, help="Порт")
+    parser.add_argument("--db", default=DB_PATH, help="Путь к базе SQLite")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE,
+                        help="Максимум заявок в очереди на запись")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="Максимум заявок в одной транзакции")
+    parser.add_argument("--linger-ms", type=float, default=BATCH_LINGER_MS,
+                        help="Сколько ждать добора пачки перед записью")
+    args = parser.parse_args()
+    asyncio.run(serve(args))
+
+
+if __name__ == "__main__":
+    main()
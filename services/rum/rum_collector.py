@@ -0,0 +1,556 @@
+#!/usr/bin/env python3
+"""
+Сборщик метрик реальных пользователей (RUM) для /api/rum
+Принимает beacon'ы от PerformanceMonitor (LCP, CLS, INP, TTFB, ...), раскладывает
+значения по логарифмическим гистограммам (день, страница, тип сети, протокол,
+метрика) и периодически сбрасывает накопленные приращения в SQLite.
+Отчёт p75 по страницам за день: HTTP GET /report?day=YYYY-MM-DD или `report` в CLI
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import signal
+import asyncio
+import sqlite3
+import argparse
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+# Конфигурация (переопределяется переменными окружения)
+HOST = os.environ.get("RUM_HOST", "0.0.0.0")
+PORT = int(os.environ.get("RUM_PORT", "8081"))
+DB_PATH = os.environ.get("RUM_DB_PATH", "/data/rum.db")
+FLUSH_INTERVAL = float(os.environ.get("RUM_FLUSH_INTERVAL", "30"))
+RETENTION_DAYS = int(os.environ.get("RUM_RETENTION_DAYS", "90"))
+# Сутки считаются по московскому времени
+TZ_OFFSET_HOURS = float(os.environ.get("RUM_TZ_OFFSET_HOURS", "3"))
+MAX_PAGES_PER_DAY = int(os.environ.get("RUM_MAX_PAGES_PER_DAY", "200"))
+
+MAX_BODY = 4 * 1024
+MAX_HEADERS = 8 * 1024
+MAX_RECORDS = 10
+# Сколько последних просмотров помнить, чтобы повторный beacon заменял предыдущий
+MAX_VIEWS = int(os.environ.get("RUM_MAX_VIEWS", "20000"))
+IDLE_TIMEOUT = 30
+# Docker шлёт SIGKILL через 10 с после SIGTERM: столько ждём незавершённые запросы
+SHUTDOWN_TIMEOUT = 5
+
+# Метрика -> (множитель при записи, верхняя граница допустимого значения)
+# CLS безразмерный, храним его в тысячных
+METRICS = {
+    "lcp": (1, 120_000),
+    "cls": (1000, 100_000),
+    "inp": (1, 60_000),
+    "ttfb": (1, 120_000),
+    "fcp": (1, 120_000),
+    "dcl": (1, 300_000),
+    "load": (1, 300_000),
+}
+
+CONNECTIONS = {"slow-2g", "2g", "3g", "4g"}
+PROTOCOLS = {"h2", "h3", "http/1.1", "http/1.0"}
+PAGE_RE = re.compile(r"^/[A-Za-z0-9._~/-]{0,127}$")
+VIEW_RE = re.compile(r"^[A-Za-z0-9-]{8,36}$")
+
+# Логарифмические корзины: соседние границы отличаются на 5%
+BUCKET_BASE = 1.05
+LOG_BASE = math.log(BUCKET_BASE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rum_hist (
+    day TEXT NOT NULL,
+    page TEXT NOT NULL,
+    conn TEXT NOT NULL,
+    proto TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, page, conn, proto, metric, bucket)
+) WITHOUT ROWID
+"""
+
+UPSERT = """
+INSERT INTO rum_hist (day, page, conn, proto, metric, bucket, count)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (day, page, conn, proto, metric, bucket)
+DO UPDATE SET count = count + excluded.count
+"""
+
+REASONS = {
+    200: "OK", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 411: "Length Required",
+    413: "Payload Too Large", 500: "Internal Server Error",
+}
+
+
+def bucket_of(value):
+    """Номер корзины для неотрицательного значения"""
+    if value < 1:
+        return 0
+    return int(math.log(value) / LOG_BASE) + 1
+
+
+def bucket_value(bucket):
+    """Представительное значение корзины (середина её границ)"""
+    if bucket == 0:
+        return 0.5
+    low = BUCKET_BASE ** (bucket - 1)
+    return low * (1 + BUCKET_BASE) / 2
+
+
+def percentile(buckets, p):
+    """Перцентиль по словарю корзина -> количество"""
+    total = sum(buckets.values())
+    if not total:
+        return None
+    rank = total * p / 100
+    seen = 0
+    for bucket in sorted(buckets):
+        seen += buckets[bucket]
+        if seen >= rank:
+            return bucket_value(bucket)
+    return bucket_value(max(buckets))
+
+
+def today(now=None):
+    now = time.time() if now is None else now
+    return time.strftime("%Y-%m-%d", time.gmtime(now + TZ_OFFSET_HOURS * 3600))
+
+
+def normalize_record(record):
+    """Проверить одну запись beacon'а, вернуть (page, conn, proto, {метрика: значение})"""
+    if not isinstance(record, dict):
+        return None
+    page = record.get("p")
+    if not isinstance(page, str) or not PAGE_RE.match(page):
+        return None
+    if page.endswith("/index.html"):
+        page = page[:-len("index.html")]
+    conn = record.get("c") if record.get("c") in CONNECTIONS else "unknown"
+    proto = record.get("h") if record.get("h") in PROTOCOLS else "unknown"
+    values = {}
+    metrics = record.get("m")
+    if not isinstance(metrics, dict):
+        return None
+    for name, value in metrics.items():
+        spec = METRICS.get(name)
+        if spec is None or isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        scale, limit = spec
+        value = value * scale
+        if 0 <= value <= limit:
+            values[name] = value
+    if not values:
+        return None
+    return page, conn, proto, values
+
+
+class HistogramStore:
+    """Гистограммы в SQLite; все вызовы идут из одного потока"""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, isolation_level=None,
+                                    check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(SCHEMA)
+
+    def merge(self, rows):
+        """Прибавить приращения корзин одной транзакцией"""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.executemany(UPSERT, rows)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def expire(self, keep_from):
+        self.conn.execute("DELETE FROM rum_hist WHERE day < ?", (keep_from,))
+
+    def report(self, day, metrics=None, conn=None, proto=None, p=75):
+        """Перцентиль по страницам за день: {page: {metric: (value, samples)}}"""
+        query = "SELECT page, metric, bucket, SUM(count) FROM rum_hist WHERE day = ?"
+        params = [day]
+        if conn:
+            query += " AND conn = ?"
+            params.append(conn)
+        if proto:
+            query += " AND proto = ?"
+            params.append(proto)
+        query += " GROUP BY page, metric, bucket"
+
+        hists = defaultdict(lambda: defaultdict(dict))
+        for page, metric, bucket, count in self.conn.execute(query, params):
+            if metrics and metric not in metrics:
+                continue
+            hists[page][metric][bucket] = count
+
+        result = {}
+        for page, by_metric in sorted(hists.items()):
+            result[page] = {}
+            for metric, buckets in sorted(by_metric.items()):
+                value = percentile(buckets, p)
+                if metric == "cls":
+                    value = round(value / METRICS["cls"][0], 3)
+                else:
+                    value = round(value)
+                result[page][metric] = (value, sum(buckets.values()))
+        return result
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.conn.close()
+            self.conn = None
+
+
+class RumCollector:
+    """HTTP-приёмник beacon'ов; гистограммы копятся в памяти до сброса"""
+
+    def __init__(self, db_path=DB_PATH, flush_interval=FLUSH_INTERVAL):
+        self.store = HistogramStore(db_path)
+        self.flush_interval = flush_interval
+        # (day, page, conn, proto, metric, bucket) -> приращение счётчика
+        self.pending = defaultdict(int)
+        self.pages = defaultdict(set)
+        # id просмотра -> корзины его последнего beacon'а
+        self.views = OrderedDict()
+        self.received = 0
+        self.dropped = 0
+        self.server = None
+        # Задача соединения -> writer; busy - те, что сейчас обрабатывают запрос
+        self.connections = {}
+        self.busy = set()
+        self.closing = False
+        self.flush_task = None
+        self.last_expire = None
+        self.executor = ThreadPoolExecutor(max_workers=1,
+                                           thread_name_prefix="rum-writer")
+
+    async def start(self, host=HOST, port=PORT):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.store.open)
+        self.flush_task = asyncio.create_task(self._flush_loop())
+        self.server = await asyncio.start_server(
+            self._handle_connection, host, port, limit=MAX_HEADERS)
+        return self.server
+
+    async def stop(self):
+        """Сбросить гистограммы, закрыть keep-alive соединения и БД за SHUTDOWN_TIMEOUT"""
+        self.closing = True
+        if self.server is not None:
+            self.server.close()
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            try:
+                await self.flush_task
+            except asyncio.CancelledError:
+                pass
+        # Сначала сохраняем накопленное: дальше ждём клиентов, и нас могут убить
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"[RUM] Ошибка сброса гистограмм: {e}", file=sys.stderr)
+        await self._close_connections()
+        if self.server is not None:
+            # С Python 3.12 wait_closed ждёт все соединения - они уже закрыты
+            try:
+                await asyncio.wait_for(self.server.wait_closed(), 1)
+            except asyncio.TimeoutError:
+                pass
+        loop = asyncio.get_running_loop()
+        try:
+            # beacon'ы, принятые, пока отвечали занятые соединения
+            await self.flush()
+        finally:
+            await loop.run_in_executor(self.executor, self.store.close)
+            self.executor.shutdown()
+
+    async def _close_connections(self):
+        """Закрыть простаивающие соединения, дать занятым ответить (с Connection: close)"""
+        for task, writer in list(self.connections.items()):
+            if task not in self.busy:
+                writer.close()
+        if self.connections:
+            _, pending = await asyncio.wait(list(self.connections), timeout=SHUTDOWN_TIMEOUT)
+            for task in pending:
+                task.cancel()
+
+    def ingest(self, payload):
+        """Разложить beacon по гистограммам; возвращает число принятых записей"""
+        records = payload if isinstance(payload, list) else [payload]
+        day = today()
+        accepted = 0
+        for record in records[:MAX_RECORDS]:
+            normalized = normalize_record(record)
+            if normalized is None:
+                self.dropped += 1
+                continue
+            page, conn, proto, values = normalized
+            # Ограничиваем число страниц в сутки, чтобы не раздувать БД мусорными URL
+            pages = self.pages[day]
+            if page not in pages:
+                if len(pages) >= MAX_PAGES_PER_DAY:
+                    page = "(other)"
+                pages.add(page)
+            keys = [(day, page, conn, proto, metric, bucket_of(value))
+                    for metric, value in values.items()]
+            view = record.get("v")
+            if isinstance(view, str) and VIEW_RE.match(view):
+                # Новый beacon того же просмотра (вкладку скрыли ещё раз) заменяет прежний
+                for key in self.views.pop(view, ()):
+                    self.pending[key] -= 1
+                self.views[view] = keys
+                if len(self.views) > MAX_VIEWS:
+                    self.views.popitem(last=False)
+            for key in keys:
+                self.pending[key] += 1
+            accepted += 1
+        self.received += accepted
+        return accepted
+
+    async def flush(self):
+        """Сбросить накопленные приращения в SQLite"""
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, defaultdict(int)
+        rows = [key + (count,) for key, count in pending.items() if count]
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self.executor, self.store.merge, rows)
+        except Exception:
+            # Не теряем счётчики: вернём их к тем, что пришли за время записи
+            for key, count in pending.items():
+                self.pending[key] += count
+            raise
+
+        day = today()
+        if self.last_expire != day:
+            self.last_expire = day
+            keep_from = today(time.time() - RETENTION_DAYS * 86400)
+            await loop.run_in_executor(self.executor, self.store.expire, keep_from)
+            for old in [d for d in self.pages if d != day]:
+                del self.pages[old]
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                # shield: отмена при остановке не должна прервать запись на полпути
+                await asyncio.shield(self.flush())
+            except Exception as e:
+                print(f"[RUM] Ошибка сброса гистограмм: {e}", file=sys.stderr)
+
+    async def _handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self.connections[task] = writer
+        try:
+            while not self.closing:
+                try:
+                    head = await asyncio.wait_for(
+                        reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError,
+                        asyncio.LimitOverrunError, ConnectionError):
+                    break
+                self.busy.add(task)
+
+                request = self._parse_head(head)
+                if request is None:
+                    await self._respond(writer, 400, {"error": "bad request"}, False)
+                    break
+                method, path, query, headers, keep_alive = request
+
+                if "transfer-encoding" in headers:
+                    await self._respond(writer, 411, {"error": "length required"}, False)
+                    break
+                length = headers.get("content-length", "0")
+                if not length.isdigit() or int(length) > MAX_BODY:
+                    await self._respond(writer, 413, {"error": "too large"}, False)
+                    break
+                body = await reader.readexactly(int(length)) if int(length) else b""
+
+                try:
+                    status, payload = await self._route(method, path, query, body)
+                except Exception as e:
+                    print(f"[RUM] Ошибка обработки {method} {path}: {e}", file=sys.stderr)
+                    status, payload = 500, {"error": "internal error"}
+                keep_alive = keep_alive and not self.closing
+                await self._respond(writer, status, payload, keep_alive)
+                self.busy.discard(task)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.connections.pop(task, None)
+            self.busy.discard(task)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    @staticmethod
+    def _parse_head(head):
+        try:
+            lines = head.decode("latin-1").split("\r\n")
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            return None
+        headers = {}
+        for line in lines[1:]:
+            key, sep, value = line.partition(":")
+            if sep:
+                headers[key.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.1":
+            keep_alive = connection != "close"
+        else:
+            keep_alive = connection == "keep-alive"
+        path, _, query = target.partition("?")
+        return method.upper(), path, dict(parse_qsl(query)), headers, keep_alive
+
+    async def _route(self, method, path, query, body):
+        if path == "/api/rum":
+            if method != "POST":
+                return 405, {"error": "method not allowed"}
+            # sendBeacon присылает text/plain, поэтому тип содержимого не проверяем
+            try:
+                payload = json.loads(body.decode("utf-8"))
+            except (ValueError, UnicodeDecodeError):
+                self.dropped += 1
+                return 400, {"error": "bad body"}
+            self.ingest(payload)
+            return 204, None
+        if path == "/report" and method == "GET":
+            try:
+                p = float(query.get("p", 75))
+            except ValueError:
+                p = None
+            if p is None or not 0 <= p <= 100:
+                return 400, {"error": "p must be a number from 0 to 100"}
+            await self.flush()
+            day = query.get("day") or today()
+            loop = asyncio.get_running_loop()
+            report = await loop.run_in_executor(
+                self.executor, lambda: self.store.report(
+                    day, conn=query.get("conn"), proto=query.get("proto"), p=p))
+            pages = {page: {metric: {"value": value, "samples": samples}
+                            for metric, (value, samples) in by_metric.items()}
+                     for page, by_metric in report.items()}
+            return 200, {"day": day, "pages": pages}
+        if path == "/healthz" and method == "GET":
+            return 200, {"status": "ok", "received": self.received,
+                         "dropped": self.dropped, "pending": len(self.pending)}
+        return 404, {"error": "not found"}
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive=True):
+        body = b"" if payload is None else json.dumps(
+            payload, ensure_ascii=False).encode("utf-8")
+        head = [
+            f"HTTP/1.1 {status} {REASONS.get(status, 'Unknown')}",
+            f"Content-Length: {len(body)}",
+            "Cache-Control: no-store",
+            "Connection: " + ("keep-alive" if keep_alive else "close"),
+        ]
+        if body:
+            head.append("Content-Type: application/json; charset=utf-8")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve(args):
+    collector = RumCollector(args.db, args.flush_interval)
+    await collector.start(args.host, args.port)
+    print(f"[RUM] Слушаю {args.host}:{args.port}, БД: {args.db}", flush=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    print("[RUM] Останавливаюсь, сбрасываю гистограммы...", flush=True)
+    await collector.stop()
+
+
+def print_report(args):
+    """Таблица p75 по страницам за день"""
+    store = HistogramStore(args.db)
+    store.open()
+    try:
+        metrics = args.metrics.split(",") if args.metrics else None
+        report = store.report(args.day or today(), metrics, args.conn,
+                              args.proto, args.p)
+    finally:
+        store.close()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+    if not report:
+        print(f"Нет данных за {args.day or today()}")
+        return
+
+    columns = metrics or [m for m in METRICS if any(m in r for r in report.values())]
+    print(f"p{args.p:g} за {args.day or today()}")
+    print("page".ljust(32) + "".join(c.rjust(12) for c in columns) + "samples".rjust(10))
+    for page, by_metric in report.items():
+        cells = []
+        samples = 0
+        for metric in columns:
+            if metric in by_metric:
+                value, count = by_metric[metric]
+                cells.append(str(value).rjust(12))
+                samples = max(samples, count)
+            else:
+                cells.append("-".rjust(12))
+        print(page[:31].ljust(32) + "".join(cells) + str(samples).rjust(10))
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description="Сборщик RUM-метрик сайта")
+    sub = parser.add_subparsers(dest="command")
+
+    serve_parser = sub.add_parser("serve", help="Запустить приёмник beacon'ов")
+    serve_parser.add_argument("--host", default=HOST, help="Адрес для прослушивания")
+    serve_parser.add_argument("--port", type=int, default=PORT, help="Порт")
+    serve_parser.add_argument("--db", default=DB_PATH, help="Путь к базе SQLite")
+    serve_parser.add_argument("--flush-interval", type=float, default=FLUSH_INTERVAL,
+                              help="Период сброса гистограмм в БД, секунд")
+
+    report_parser = sub.add_parser("report", help="Показать перцентили по страницам")
+    report_parser.add_argument("--db", default=DB_PATH, help="Путь к базе SQLite")
+    report_parser.add_argument("--day", help="День YYYY-MM-DD (по умолчанию сегодня)")
+    report_parser.add_argument("--metrics", help="Метрики через запятую (lcp,cls,inp)")
+    report_parser.add_argument("--conn", help="Только указанный тип сети (4g, 3g, ...)")
+    report_parser.add_argument("--proto", help="Только указанный протокол (h2, h3, ...)")
+    report_parser.add_argument("--p", type=float, default=75, help="Перцентиль")
+    report_parser.add_argument("--json", action="store_true", help="Вывод в JSON")
+
+    args = parser.parse_args()
+    if args.command == "report":
+        print_report(args)
+    else:
+        if args.command is None:
+            args = serve_parser.parse_args([])
+        asyncio.run(serve(args))
+
+
+if __name__ == "__main__":
+    main()
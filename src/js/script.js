@@ -196,22 +196,44 @@ class FormHandler {
         submitBtn.textContent = 'Отправляем...';
         submitBtn.disabled = true;
         
-        // Simulate form submission (replace with actual API call)
-        setTimeout(() => {
-            this.showSuccess(form);
-            this.resetForm(form);
-            
-            submitBtn.textContent = originalText;
-            submitBtn.disabled = false;
-        }, 2000);
+        data.form = form.id || 'contact_form';
+        data.page = window.location.pathname;
         
-        // Track form submission (Google Analytics)
-        if (typeof gtag !== 'undefined') {
-            gtag('event', 'form_submit', {
-                'event_category': 'engagement',
-                'event_label': form.id || 'contact_form'
+        fetch('/api/lead', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(data)
+        })
+            .then(response => response.json().catch(() => ({})).then(body => ({ response, body })))
+            .then(({ response, body }) => {
+                if (response.ok) {
+                    this.showSuccess(form);
+                    this.resetForm(form);
+                    
+                    // Track form submission (Google Analytics)
+                    if (typeof gtag !== 'undefined') {
+                        gtag('event', 'form_submit', {
+                            'event_category': 'engagement',
+                            'event_label': data.form
+                        });
+                    }
+                } else if (response.status === 400 && body.fields) {
+                    // Server-side validation errors
+                    Object.entries(body.fields).forEach(([name, message]) => {
+                        const input = form.querySelector(`[name="${name}"]`);
+                        if (input) {
+                            this.showError(input, message);
+                        }
+                    });
+                } else {
+                    this.showFailure(form);
+                }
+            })
+            .catch(() => this.showFailure(form))
+            .finally(() => {
+                submitBtn.textContent = originalText;
+                submitBtn.disabled = false;
             });
-        }
     }
 
     validateForm(data, form) {
@@ -267,6 +289,22 @@ class FormHandler {
         }, 5000);
     }
 
+    showFailure(form) {
+        const failure = document.createElement('div');
+        failure.className = 'error-message';
+        failure.innerHTML = `
+            <div style="background: #e74c3c; color: white; padding: 1rem; border-radius: 8px; margin: 1rem 0; text-align: center;">
+                Не удалось отправить заявку. Попробуйте ещё раз или позвоните нам: +7 (495) 123-45-67
+            </div>
+        `;
+        
+        form.insertBefore(failure, form.firstChild);
+        
+        setTimeout(() => {
+            failure.remove();
+        }, 5000);
+    }
+
     resetForm(form) {
         form.reset();
         form.querySelectorAll('.form__input.invalid').forEach(input => {
@@ -392,15 +430,34 @@ class CounterAnimation {
     }
 }
 
-// Performance monitoring
+// Performance monitoring (RUM beacon to /api/rum)
 class PerformanceMonitor {
     constructor() {
+        this.endpoint = '/api/rum';
+        this.metrics = {};
+        this.lastBeacon = '';
+
+        // One id per page view: the collector keeps only the latest beacon per id
+        this.viewId = window.crypto && crypto.randomUUID
+            ? crypto.randomUUID()
+            : Date.now().toString(36) + '-' + Math.random().toString(36).slice(2, 10);
+
+        // CLS: session windows (max 5s, gap < 1s), report the largest one
+        this.clsValue = 0;
+        this.clsSessionValue = 0;
+        this.clsSessionStart = 0;
+        this.clsSessionLast = 0;
+
+        // INP: longest interactions, bounded list
+        this.interactions = new Map();
+        this.interactionCount = 0;
+
         this.init();
     }
 
     init() {
         // Monitor Core Web Vitals
-        if ('web-vital' in window) {
+        if ('PerformanceObserver' in window) {
             this.trackWebVitals();
         }
 
@@ -408,23 +465,88 @@ class PerformanceMonitor {
         window.addEventListener('load', () => {
             setTimeout(() => this.trackPerformanceMetrics(), 0);
         });
+
+        // Send a batched beacon every time the page is hidden or unloaded:
+        // CLS and INP keep growing if the user comes back to the tab
+        document.addEventListener('visibilitychange', () => {
+            if (document.visibilityState === 'hidden') {
+                this.flush();
+            }
+        });
+        window.addEventListener('pagehide', () => this.flush());
+    }
+
+    observe(type, callback, options = {}) {
+        const supported = PerformanceObserver.supportedEntryTypes || [];
+        if (!supported.includes(type)) {
+            return;
+        }
+        try {
+            const observer = new PerformanceObserver((list) => {
+                list.getEntries().forEach(callback);
+            });
+            observer.observe({ type, buffered: true, ...options });
+        } catch (e) {
+            console.log(`Performance Observer not supported: ${type}`);
+        }
     }
 
     trackWebVitals() {
-        // This would integrate with web-vitals library
-        // For now, we'll use Performance Observer API
-        if ('PerformanceObserver' in window) {
-            try {
-                const observer = new PerformanceObserver((list) => {
-                    const entries = list.getEntries();
-                    entries.forEach(entry => {
-                        console.log(`${entry.name}: ${entry.startTime}`);
-                    });
-                });
-                observer.observe({ entryTypes: ['navigation', 'paint', 'largest-contentful-paint'] });
-            } catch (e) {
-                console.log('Performance Observer not supported');
+        this.observe('paint', (entry) => {
+            if (entry.name === 'first-contentful-paint') {
+                this.metrics.fcp = Math.round(entry.startTime);
+            }
+        });
+
+        // The last LCP candidate before user input is the final value
+        this.observe('largest-contentful-paint', (entry) => {
+            this.metrics.lcp = Math.round(entry.startTime);
+        });
+
+        this.observe('layout-shift', (entry) => {
+            if (entry.hadRecentInput) {
+                return;
             }
+            if (this.clsSessionValue &&
+                entry.startTime - this.clsSessionLast < 1000 &&
+                entry.startTime - this.clsSessionStart < 5000) {
+                this.clsSessionValue += entry.value;
+            } else {
+                this.clsSessionValue = entry.value;
+                this.clsSessionStart = entry.startTime;
+            }
+            this.clsSessionLast = entry.startTime;
+            this.clsValue = Math.max(this.clsValue, this.clsSessionValue);
+            this.metrics.cls = Math.round(this.clsValue * 10000) / 10000;
+        });
+
+        this.observe('event', (entry) => {
+            if (!entry.interactionId) {
+                return;
+            }
+            const previous = this.interactions.get(entry.interactionId);
+            if (previous === undefined) {
+                this.interactionCount++;
+            }
+            this.interactions.set(entry.interactionId, Math.max(previous || 0, entry.duration));
+            this.updateInp();
+        }, { durationThreshold: 40 });
+    }
+
+    updateInp() {
+        // INP ~ 98th percentile: skip one longest interaction per 50
+        const durations = Array.from(this.interactions.values()).sort((a, b) => b - a);
+        const index = Math.min(Math.floor(this.interactionCount / 50), durations.length - 1);
+        this.metrics.inp = Math.round(durations[index]);
+
+        // Keep only the longest ones to bound memory
+        if (this.interactions.size > 20) {
+            const keep = durations[9];
+            this.interactions.forEach((duration, id) => {
+                if (duration < keep && this.interactions.size > 10) {
+                    this.interactions.delete(id);
+                }
+            });
         }
     }
 
@@ -433,13 +555,15 @@ class PerformanceMonitor {
         
         if (navigation) {
             const metrics = {
-                pageLoadTime: navigation.loadEventEnd - navigation.loadEventStart,
-                domContentLoaded: navigation.domContentLoadedEventEnd - navigation.domContentLoadedEventStart,
+                pageLoadTime: navigation.loadEventStart,
+                domContentLoaded: navigation.domContentLoadedEventEnd,
                 timeToFirstByte: navigation.responseStart - navigation.requestStart
             };
 
-            // Send to analytics (replace with your analytics service)
-            console.log('Performance metrics:', metrics);
+            this.metrics.ttfb = Math.round(metrics.timeToFirstByte);
+            this.metrics.dcl = Math.round(metrics.domContentLoaded);
+            this.metrics.load = Math.round(metrics.pageLoadTime);
+            this.protocol = navigation.nextHopProtocol;
             
             if (typeof gtag !== 'undefined') {
                 gtag('event', 'timing_complete', {
@@ -449,6 +573,27 @@ class PerformanceMonitor {
             }
         }
     }
+
+    flush() {
+        if (!Object.keys(this.metrics).length || !navigator.sendBeacon) {
+            return;
+        }
+
+        const connection = navigator.connection || {};
+        const beacon = JSON.stringify({
+            v: this.viewId,
+            p: window.location.pathname,
+            c: connection.effectiveType || '',
+            h: this.protocol || '',
+            m: this.metrics
+        });
+        // visibilitychange and pagehide often fire back to back with the same values
+        if (beacon === this.lastBeacon) {
+            return;
+        }
+        this.lastBeacon = beacon;
+        navigator.sendBeacon(this.endpoint, beacon);
+    }
 }
 
 // Error handling
@@ -0,0 +1,172 @@
+"""
+Проверки build.py: хэшированные имена, переписывание ссылок, подсказки Link и sw.js
+Запуск: python3 -m unittest discover tests (или pytest)
+"""
+
+import io
+import re
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import build  # noqa: E402
+
+INDEX = """<!DOCTYPE html>
+<html>
+<head>
+    <link rel="stylesheet" href="/css/style.css">
+</head>
+<body>
+    <script src="/js/script.js"></script>
+</body>
+</html>
+"""
+
+
+def sw_list(sw, name):
+    """Значение JSON-массива const NAME = [...] из sw.js"""
+    match = re.search(rf"const {name} = (\[.*?\]);", sw)
+    return json.loads(match.group(1))
+
+
+class BuildHelpersTest(unittest.TestCase):
+
+    def test_hashed_name(self):
+        self.assertEqual(build.hashed_name("css/style.css", "1a2b3c4d"), "css/style.1a2b3c4d.css")
+        self.assertEqual(build.hashed_name("logo.svg", "00ff00ff"), "logo.00ff00ff.svg")
+        self.assertEqual(build.hashed_name("js/app.min.js", "abcdef12"), "js/app.min.abcdef12.js")
+
+    def test_page_url(self):
+        self.assertEqual(build.page_url("index.html"), "/")
+        self.assertEqual(build.page_url("blog/index.html"), "/blog/")
+        self.assertEqual(build.page_url("about.html"), "/about.html")
+
+    def test_rewrite_refs_attributes_and_css(self):
+        mapping = {"css/style.css": "css/style.1a2b3c4d.css"}
+        self.assertEqual(build.rewrite_refs('<link href="/css/style.css">', mapping),
+                         '<link href="/css/style.1a2b3c4d.css">')
+        self.assertEqual(build.rewrite_refs("@import url(/css/style.css);", mapping),
+                         "@import url(/css/style.1a2b3c4d.css);")
+        self.assertEqual(build.rewrite_refs("<a href='/css/style.css?v=2#top'>", mapping),
+                         "<a href='/css/style.1a2b3c4d.css?v=2#top'>")
+
+    def test_rewrite_refs_boundaries(self):
+        # Имя ассета — префикс другого пути или часть чужого URL: не трогаем
+        mapping = {"css/style.css": "css/style.1a2b3c4d.css"}
+        for text in ('<a href="/css/style.css.map">',
+                     '<a href="/css/style.css2">',
+                     '<a href="/old/css/style.css">',
+                     '<a href="https://cdn.example.org/css/style.css">',
+                     '<a href="css/style.css">'):
+            self.assertEqual(build.rewrite_refs(text, mapping), text)
+
+    def test_collect_files(self):
+        src = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, src, ignore_errors=True)
+        for rel in ("index.html", "blog/index.html", "sw.js", "img/.gitkeep",
+                    "js/script.js", "css/style.css", "img/logo.svg"):
+            (src / rel).parent.mkdir(parents=True, exist_ok=True)
+            (src / rel).write_text("x")
+        pages, assets = build.collect_files(src)
+        self.assertEqual(pages, ["blog/index.html", "index.html"])
+        # Сначала листовые ассеты, затем CSS, затем JS; sw.js и .gitkeep пропускаются
+        self.assertEqual(assets, ["img/logo.svg", "css/style.css", "js/script.js"])
+
+
+class PageDependenciesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.out = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.out, ignore_errors=True)
+        (self.out / "css").mkdir()
+        (self.out / "css/style.css").write_text(
+            "@font-face { src: url(/fonts/inter.woff2) format('woff2'); }\n"
+            "body { background: url(/img/bg.svg); }\n")
+
+    def test_hints_only_late_resources_and_csp_origins(self):
+        html = """<head>
+            <link rel="stylesheet" href="/css/style.css">
+            <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
+            <link rel="stylesheet" href="https://fonts.googleapis.com/css2?family=Inter">
+            <link rel="stylesheet" href="https://cdn.example.org/lib.css">
+        </head><body><div class="hero"><img src="/img/hero.webp"></div></body>"""
+        self.assertEqual(build.page_dependencies(html, self.out), [
+            ("https://fonts.gstatic.com", "preconnect", None, True),
+            ("https://fonts.googleapis.com", "preconnect", None, False),
+            ("/fonts/inter.woff2", "preload", "font", True),
+            ("/img/hero.webp", "preload", "image", False),
+        ])
+
+
+class BuildOutputTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.src = self.tmp / "src"
+        files = {
+            "index.html": INDEX,
+            "offline.html": "<html><body>Нет сети</body></html>\n",
+            "css/style.css": "body { background: url(/img/bg.svg); }\n",
+            "js/script.js": "console.log('ok');\n",
+            "img/bg.svg": "<svg xmlns='http://www.w3.org/2000/svg'/>\n",
+        }
+        for rel, text in files.items():
+            (self.src / rel).parent.mkdir(parents=True, exist_ok=True)
+            (self.src / rel).write_text(text, encoding="utf-8")
+        self.out = self.tmp / "dist"
+        self.nginx = self.tmp / "dist-nginx"
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def run_build(self):
+        with redirect_stdout(io.StringIO()):
+            return build.build(self.src, self.out, self.nginx)
+
+    def hashed(self, prefix, suffix):
+        matches = sorted(p.relative_to(self.out).as_posix()
+                         for p in self.out.rglob(f"{prefix}.*{suffix}"))
+        self.assertEqual(len(matches), 1, matches)
+        return matches[0]
+
+    def test_service_worker_lists(self):
+        digest = self.run_build()
+        sw = (self.out / "sw.js").read_text(encoding="utf-8")
+        css = self.hashed("css/style", ".css")
+        js = self.hashed("js/script", ".js")
+        svg = self.hashed("img/bg", ".svg")
+        self.assertEqual(sorted(sw_list(sw, "STATIC_ASSETS")), sorted(["/" + css, "/" + js, "/" + svg]))
+        self.assertEqual(sw_list(sw, "PAGES"), ["/", "/offline.html"])
+        self.assertIn("const OFFLINE_URL = '/offline.html';", sw)
+        self.assertIn(f"const BUILD = '{digest}';", sw)
+
+    def test_references_point_to_hashed_assets(self):
+        self.run_build()
+        css = self.hashed("css/style", ".css")
+        index = (self.out / "index.html").read_text(encoding="utf-8")
+        self.assertIn(f'href="/{css}"', index)
+        self.assertIn(f'<script defer src="/{self.hashed("js/script", ".js")}">', index)
+        self.assertIn(f"url(/{self.hashed('img/bg', '.svg')})",
+                      (self.out / css).read_text(encoding="utf-8"))
+
+    def test_build_hash_follows_content(self):
+        first = self.run_build()
+        self.assertEqual(self.run_build(), first)
+        (self.src / "css/style.css").write_text("body { color: red; }\n", encoding="utf-8")
+        self.assertNotEqual(self.run_build(), first)
+
+    def test_missing_offline_page(self):
+        (self.src / "offline.html").unlink()
+        with redirect_stdout(io.StringIO()), self.assertRaises(SystemExit):
+            build.build(self.src, self.out, self.nginx)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+"""
+Проверки docker_api.py против поддельного демона scripts/fake_docker.py
+Запуск: python3 -m unittest discover tests (или pytest)
+"""
+
+import io
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "scripts"))
+
+import docker_api  # noqa: E402
+import update  # noqa: E402
+import fake_docker  # noqa: E402
+from fake_docker import FakeDocker, FakeDockerServer  # noqa: E402
+
+WEB = "service-moscow-web"
+NGINX = "service-moscow-nginx"
+
+
+class DockerApiTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.tmp, "docker.sock")
+        self.docker = FakeDocker((WEB, NGINX))
+        self.server = FakeDockerServer(self.socket_path, self.docker).start()
+        self.client = docker_api.connect(self.socket_path)
+        self.assertIsNotNone(self.client)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_negotiates_daemon_version(self):
+        self.assertEqual(self.client.api_version, fake_docker.API_VERSION)
+
+    def test_connect_without_socket(self):
+        self.assertIsNone(docker_api.connect(os.path.join(self.tmp, "missing.sock")))
+
+    def test_inspect_missing_container(self):
+        with self.assertRaises(docker_api.DockerError) as ctx:
+            self.client.inspect("nope")
+        self.assertEqual(ctx.exception.status, 404)
+        self.assertIn("nope", ctx.exception.message)
+
+    def test_containers(self):
+        names = sorted(c.name for c in self.client.containers())
+        self.assertEqual(names, [NGINX, WEB])
+
+    def test_exec_waits_for_exit_code(self):
+        # Демон отдаёт ExitCode только через EXEC_SETTLE после закрытия потока
+        result = self.client.exec(NGINX, ["nginx", "-s", "reload"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output, "exec: nginx -s reload\ndone\n")
+
+    def test_exec_nonzero_exit_code(self):
+        self.assertEqual(self.client.exec(WEB, ["false"]).exit_code, 1)
+
+    def test_connection_reused_after_exec(self):
+        # exec start захватывает своё соединение, постоянное остаётся рабочим
+        self.client.exec(WEB, ["true"])
+        self.client.exec(WEB, ["true"])
+        self.assertEqual(self.client.inspect(WEB)["Name"], "/" + WEB)
+
+    def test_exec_missing_container(self):
+        with self.assertRaises(docker_api.DockerError) as ctx:
+            self.client.exec("nope", ["true"])
+        self.assertEqual(ctx.exception.status, 404)
+
+    def test_run_removes_container(self):
+        result = self.client.run("certbot/certbot:latest", ["certonly", "-d", "example.org"],
+                                 name="certbot", binds=["/tmp:/etc/letsencrypt"])
+        self.assertEqual(result, docker_api.ExecResult(0, "ran: certonly -d example.org\n"))
+        self.assertNotIn("certbot", self.docker.containers)
+
+    def test_wait_healthy_by_events(self):
+        started = time.time()
+        self.assertEqual(self.client.wait_healthy(WEB, timeout=5), "healthy")
+        self.assertLess(time.time() - started, 2)
+
+    def test_wait_healthy_without_healthcheck(self):
+        # Без healthcheck событий не будет: ответ сразу, а не через timeout
+        self.docker.containers[NGINX].update(NoHealth=True, State="restarting")
+        started = time.time()
+        self.assertEqual(self.client.wait_healthy(NGINX, timeout=30), "restarting")
+        self.assertLess(time.time() - started, 1)
+
+    def test_wait_healthy_missing_container(self):
+        with self.assertRaises(docker_api.DockerError):
+            self.client.wait_healthy("nope", timeout=1)
+
+    def test_build_streams_log(self):
+        context = Path(self.tmp) / "context"
+        context.mkdir()
+        (context / "Dockerfile").write_text("FROM scratch\n")
+        items = list(self.client.build(str(context), "site:test"))
+        self.assertTrue(items[0]["stream"].startswith("Step 1/3"))
+        self.assertEqual(items[-1]["stream"], "Successfully tagged site:test\n")
+
+    def test_errors_cover_dead_socket(self):
+        client = docker_api.DockerClient(os.path.join(self.tmp, "missing.sock"))
+        client.api_version = fake_docker.API_VERSION
+        with self.assertRaises(docker_api.ERRORS):
+            client.inspect(WEB)
+
+
+class UpdateScriptTest(unittest.TestCase):
+    """update.py через API: сборка образов и логи без docker compose"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.docker = FakeDocker((WEB, NGINX, "service-moscow-lead", "service-moscow-rum"))
+        self.server = FakeDockerServer(os.path.join(self.tmp, "docker.sock"), self.docker).start()
+        for context in update.BUILD_CONTEXTS.values():
+            path = Path(self.tmp) / context
+            path.mkdir(parents=True, exist_ok=True)
+            (path / "Dockerfile").write_text("FROM scratch\n")
+        saved = update.INSTALL_DIR, update._docker
+        self.addCleanup(setattr, update, "INSTALL_DIR", saved[0])
+        self.addCleanup(setattr, update, "_docker", saved[1])
+        update.INSTALL_DIR = self.tmp
+        self.client = docker_api.connect(os.path.join(self.tmp, "docker.sock"))
+        update._docker = self.client
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_build_images_tags_match_compose(self):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.assertTrue(update.build_images())
+        tags = [f"service-moscow-{service}:latest" for service in ("web", "lead", "rum")]
+        self.assertEqual(self.docker.builds, tags)
+        # Теги - те же, что в image: у docker-compose.yml, иначе --no-build их не найдёт
+        compose = (ROOT / "docker-compose.yml").read_text()
+        for tag in tags:
+            self.assertIn(f"image: {tag}", compose)
+        self.assertIn("Successfully tagged service-moscow-rum:latest", out.getvalue())
+
+    def test_build_images_without_api(self):
+        update._docker = False
+        with redirect_stdout(io.StringIO()):
+            self.assertFalse(update.build_images())
+
+    def test_show_logs(self):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            update.show_logs()
+        self.assertIn("service-moscow-lead    | ran: ", out.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+"""
+Проверки сервиса заявок services/lead/lead_service.py: валидация и ответы HTTP
+Запуск: python3 -m unittest discover tests (или pytest)
+"""
+
+import sys
+import json
+import shutil
+import asyncio
+import sqlite3
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from urllib.parse import urlencode
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "services" / "lead"))
+
+import lead_service  # noqa: E402
+from lead_service import LeadService, ValidationError, normalize_phone, validate_lead  # noqa: E402
+
+LEAD = {"name": "Иван", "phone": "+7 (916) 123-45-67", "form": "contact"}
+
+
+class ValidationTest(unittest.TestCase):
+
+    def test_normalize_phone(self):
+        for phone in ("+7 (916) 123-45-67", "8 916 123 45 67", "79161234567",
+                      "9161234567", "8-916-123-45-67"):
+            self.assertEqual(normalize_phone(phone), "79161234567", phone)
+
+    def test_normalize_phone_rejects(self):
+        for phone in ("", None, "12345", "+1 916 123 45 67", "59161234567",
+                      "+7 916 123 45 678", "891612345"):
+            self.assertIsNone(normalize_phone(phone), phone)
+
+    def test_validate_lead(self):
+        lead = validate_lead({"name": "  Иван ", "phone": "8 916 123 45 67",
+                              "email": "ivan@example.org", "message": "x" * 5000,
+                              "unknown": "дропается"})
+        self.assertEqual(lead["name"], "Иван")
+        self.assertEqual(lead["phone"], "79161234567")
+        self.assertEqual(lead["email"], "ivan@example.org")
+        self.assertEqual(len(lead["message"]), lead_service.OPTIONAL_FIELDS["message"])
+        self.assertIsNone(lead["equipment"])
+        self.assertNotIn("unknown", lead)
+
+    def test_validate_lead_fields(self):
+        with self.assertRaises(ValidationError) as ctx:
+            validate_lead({"name": "И", "phone": "123", "email": "not-an-email"})
+        self.assertEqual(set(ctx.exception.fields), {"name", "phone", "email"})
+        with self.assertRaises(ValidationError) as ctx:
+            validate_lead({"name": "Иван"})
+        self.assertEqual(set(ctx.exception.fields), {"phone"})
+
+
+class LeadServiceTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.db = str(Path(self.tmp) / "leads.db")
+        self.service = LeadService(self.db, queue_size=1, batch_size=10, linger_ms=0)
+        await self.service.start("127.0.0.1", 0)
+        self.port = self.service.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        await self.service.stop()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def saved(self):
+        with sqlite3.connect(self.db) as conn:
+            return conn.execute("SELECT name, phone, form FROM leads ORDER BY id").fetchall()
+
+    async def request(self, body, content_type="application/json", headers=None):
+        if isinstance(body, dict):
+            body = json.dumps(body).encode("utf-8")
+        head = {"Host": "lead", "Content-Type": content_type,
+                "Content-Length": str(len(body)), "Connection": "close"}
+        head.update(headers or {})
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(("POST /api/lead HTTP/1.1\r\n"
+                      + "".join(f"{k}: {v}\r\n" for k, v in head.items())
+                      + "\r\n").encode("latin-1"))
+        # Тело не отправляем, если сервер должен отказать по заголовкам
+        if int(head["Content-Length"]) <= lead_service.MAX_BODY:
+            writer.write(body)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        head, _, payload = response.partition(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        headers = dict(line.split(": ", 1) for line in lines[1:])
+        return int(lines[0].split(" ", 2)[1]), headers, json.loads(payload)
+
+    async def test_json_lead_saved(self):
+        status, _, payload = await self.request(LEAD)
+        self.assertEqual((status, payload), (201, {"status": "ok"}))
+        self.assertEqual(self.saved(), [("Иван", "79161234567", "contact")])
+
+    async def test_form_lead_saved(self):
+        body = urlencode(LEAD).encode("utf-8")
+        status, _, _ = await self.request(body, "application/x-www-form-urlencoded")
+        self.assertEqual(status, 201)
+        self.assertEqual(self.saved(), [("Иван", "79161234567", "contact")])
+
+    async def test_unsupported_content_type(self):
+        status, _, payload = await self.request(b"name=x", "text/plain")
+        self.assertEqual((status, payload), (415, {"error": "unsupported content type"}))
+
+    async def test_validation_fields(self):
+        status, _, payload = await self.request({"name": "И", "phone": "+1 555 0100"})
+        self.assertEqual(status, 400)
+        self.assertEqual(payload["error"], "validation")
+        self.assertEqual(set(payload["fields"]), {"name", "phone"})
+        self.assertEqual(self.saved(), [])
+
+    async def test_bad_body(self):
+        status, _, payload = await self.request(b"[1, 2]")
+        self.assertEqual((status, payload), (400, {"error": "bad body"}))
+
+    async def test_too_large(self):
+        body = b"x" * (lead_service.MAX_BODY + 1)
+        status, headers, payload = await self.request(body)
+        self.assertEqual((status, payload), (413, {"error": "too large"}))
+        self.assertEqual(headers["Connection"], "close")
+
+    async def test_full_queue(self):
+        # Писатель держит первую заявку, вторая занимает единственное место в очереди
+        writing = threading.Event()
+        release = threading.Event()
+        write_batch = self.service.store.write_batch
+
+        def slow_write(rows):
+            writing.set()
+            release.wait(5)
+            write_batch(rows)
+
+        self.service.store.write_batch = slow_write
+        loop = asyncio.get_running_loop()
+        first = asyncio.create_task(self.request(LEAD))
+        await loop.run_in_executor(None, writing.wait, 5)
+        second = asyncio.create_task(self.request(dict(LEAD, name="Пётр")))
+        while self.service.queue.qsize() < 1:
+            await asyncio.sleep(0.01)
+
+        status, headers, payload = await self.request(dict(LEAD, name="Анна"))
+        self.assertEqual((status, payload), (503, {"error": "busy"}))
+        self.assertEqual(headers["Retry-After"], "1")
+
+        release.set()
+        self.assertEqual([(await first)[0], (await second)[0]], [201, 201])
+        self.assertEqual([row[0] for row in self.saved()], ["Иван", "Пётр"])
+        self.assertEqual(self.service.metrics.rejected_full, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
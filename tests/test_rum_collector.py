@@ -0,0 +1,167 @@
+"""
+Проверки сборщика RUM services/rum/rum_collector.py: гистограммы, замена beacon'ов
+просмотра, сброс в SQLite и HTTP /report
+Запуск: python3 -m unittest discover tests (или pytest)
+"""
+
+import sys
+import json
+import shutil
+import asyncio
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "services" / "rum"))
+
+import rum_collector  # noqa: E402
+from rum_collector import RumCollector, bucket_of, bucket_value, percentile  # noqa: E402
+
+VIEW = "view-0001"
+
+
+def beacon(lcp, cls=None, view=VIEW, page="/"):
+    metrics = {"lcp": lcp}
+    if cls is not None:
+        metrics["cls"] = cls
+    return {"p": page, "c": "4g", "h": "h2", "v": view, "m": metrics}
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_bucket_bounds(self):
+        self.assertEqual(bucket_of(0), 0)
+        self.assertEqual(bucket_of(0.5), 0)
+        for value in (1, 2.5, 100, 1234, 120_000):
+            # Представительное значение корзины отличается от исходного не больше чем на шаг
+            self.assertAlmostEqual(bucket_value(bucket_of(value)) / value, 1, delta=0.05)
+
+    def test_percentile(self):
+        self.assertIsNone(percentile({}, 75))
+        buckets = {bucket_of(100): 3, bucket_of(1000): 1}
+        self.assertEqual(percentile(buckets, 75), bucket_value(bucket_of(100)))
+        self.assertEqual(percentile(buckets, 76), bucket_value(bucket_of(1000)))
+        self.assertEqual(percentile(buckets, 0), bucket_value(bucket_of(100)))
+        self.assertEqual(percentile(buckets, 100), bucket_value(bucket_of(1000)))
+
+
+class CollectorTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.db = str(Path(self.tmp) / "rum.db")
+        # Периодический сброс не мешает: сбрасываем вручную
+        self.collector = RumCollector(self.db, flush_interval=3600)
+        await self.collector.start("127.0.0.1", 0)
+        self.port = self.collector.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        await self.collector.stop()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def counts(self):
+        """Сохранённые счётчики: (metric, bucket) -> count"""
+        with sqlite3.connect(self.db) as conn:
+            rows = conn.execute(
+                "SELECT metric, bucket, SUM(count) FROM rum_hist GROUP BY metric, bucket")
+            return {(metric, bucket): count for metric, bucket, count in rows}
+
+    async def request(self, method, target, body=b""):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(f"{method} {target} HTTP/1.1\r\nHost: rum\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+                     .encode("latin-1") + body)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        head, _, payload = response.partition(b"\r\n\r\n")
+        status = int(head.split(b" ", 2)[1])
+        return status, json.loads(payload) if payload else None
+
+    async def test_repeated_beacon_replaces_view(self):
+        self.collector.ingest(beacon(1000))
+        self.collector.ingest(beacon(2000))
+        await self.collector.flush()
+        self.assertEqual(self.counts(), {("lcp", bucket_of(2000)): 1})
+
+    async def test_replacement_across_flush(self):
+        # Первый beacon уже в БД: замена вычитает его отрицательным приращением
+        self.collector.ingest(beacon(1000, cls=0.05))
+        await self.collector.flush()
+        self.collector.ingest(beacon(2000, cls=0.2))
+        old = (rum_collector.today(), "/", "4g", "h2", "lcp", bucket_of(1000))
+        self.assertEqual(self.collector.pending[old], -1)
+        await self.collector.flush()
+        counts = {key: count for key, count in self.counts().items() if count}
+        self.assertEqual(counts, {("lcp", bucket_of(2000)): 1, ("cls", bucket_of(200)): 1})
+
+    async def test_views_are_independent(self):
+        self.collector.ingest(beacon(1000, view="view-0001"))
+        self.collector.ingest(beacon(1000, view="view-0002"))
+        self.collector.ingest({"p": "/", "m": {"lcp": 1000}})
+        await self.collector.flush()
+        self.assertEqual(self.counts(), {("lcp", bucket_of(1000)): 3})
+
+    async def test_flush_keeps_counts_on_merge_error(self):
+        store = self.collector.store
+        merge = store.merge
+
+        def failing_merge(rows):
+            # Пока «пишем», приходит ещё один beacon
+            self.collector.ingest(beacon(1000, view="view-0002"))
+            raise sqlite3.OperationalError("database is locked")
+
+        self.collector.ingest(beacon(1000))
+        store.merge = failing_merge
+        with self.assertRaises(sqlite3.OperationalError):
+            await self.collector.flush()
+        store.merge = merge
+        key = next(iter(self.collector.pending))
+        self.assertEqual(self.collector.pending[key], 2)
+        await self.collector.flush()
+        self.assertEqual(self.counts(), {("lcp", bucket_of(1000)): 2})
+
+    async def test_report_values(self):
+        for i, lcp in enumerate((1000, 1000, 1000, 4000)):
+            self.collector.ingest(beacon(lcp, cls=0.1, view=f"view-000{i}"))
+        self.collector.ingest(beacon(500, view="view-0100", page="/about.html"))
+        status, report = await self.request("GET", "/report")
+        self.assertEqual(status, 200)
+        home = report["pages"]["/"]
+        self.assertEqual(home["lcp"]["samples"], 4)
+        self.assertAlmostEqual(home["lcp"]["value"], 1000, delta=50)
+        self.assertAlmostEqual(home["cls"]["value"], 0.1, delta=0.005)
+        self.assertAlmostEqual(report["pages"]["/about.html"]["lcp"]["value"], 500, delta=25)
+
+        status, report = await self.request("GET", "/report?p=100")
+        self.assertAlmostEqual(report["pages"]["/"]["lcp"]["value"], 4000, delta=200)
+
+    async def test_report_rejects_bad_percentile(self):
+        for query in ("p=abc", "p=-1", "p=101", "p=nan"):
+            status, payload = await self.request("GET", f"/report?{query}")
+            self.assertEqual(status, 400, query)
+            self.assertIn("error", payload)
+
+    async def test_beacon_endpoint(self):
+        body = json.dumps([beacon(1000), {"p": "no-slash", "m": {"lcp": 1}}]).encode()
+        status, _ = await self.request("POST", "/api/rum", body)
+        self.assertEqual(status, 204)
+        self.assertEqual((self.collector.received, self.collector.dropped), (1, 1))
+        status, _ = await self.request("POST", "/api/rum", b"{not json")
+        self.assertEqual(status, 400)
+        status, _ = await self.request("GET", "/api/rum")
+        self.assertEqual(status, 405)
+
+    async def test_stop_flushes_pending(self):
+        self.collector.ingest(beacon(1000))
+        await self.collector.stop()
+        self.assertEqual(self.counts(), {("lcp", bucket_of(1000)): 1})
+        # asyncTearDown остановит ещё раз: сборщик создаём заново
+        self.collector = RumCollector(self.db, flush_interval=3600)
+        await self.collector.start("127.0.0.1", 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
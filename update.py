@@ -10,6 +10,7 @@ import subprocess
 import time
 import shutil
 import argparse
+import importlib.util
 from datetime import datetime
 from pathlib import Path
 
@@ -18,6 +19,11 @@ DOMAIN = "artur789298.work.gd"
 PROJECT_NAME = "service-moscow"
 INSTALL_DIR = f"/opt/{PROJECT_NAME}"
 BACKUP_DIR = f"{INSTALL_DIR}/backups"
+# Файлы, которые update.py перегенерирует по шаблонам deploy.py
+CONFIG_FILES = ["docker-compose.yml", "Dockerfile", "nginx/conf.d/site.conf"]
+# Образы, собираемые из исходников: сервис -> каталог контекста сборки.
+# Теги совпадают с image: в docker-compose.yml, поэтому compose up --no-build берёт готовые
+BUILD_CONTEXTS = {"web": ".", "lead": "services/lead", "rum": "services/rum"}
 
 class Colors:
     GREEN = '\033[92m'
@@ -53,6 +59,74 @@ def run_cmd(cmd, check=True, capture=False):
             error(f"Команда завершилась с ошибкой: {cmd}")
         return False
 
+_docker = None
+
+def docker():
+    """Клиент Docker Engine API (docker_api.py) или None - тогда работаем через CLI"""
+    global _docker
+    if _docker is None:
+        if INSTALL_DIR not in sys.path:
+            sys.path.append(INSTALL_DIR)
+        try:
+            import docker_api
+        except ImportError:
+            return None
+        _docker = docker_api.connect() or False
+    return _docker or None
+
+def reload_nginx():
+    """Перечитать конфигурацию edge nginx"""
+    client = docker()
+    if client is None:
+        return run_cmd(f"docker exec {PROJECT_NAME}-nginx nginx -s reload", check=False)
+    import docker_api
+    log(f"Docker API: exec {PROJECT_NAME}-nginx nginx -s reload", Colors.BLUE)
+    try:
+        result = client.exec(f"{PROJECT_NAME}-nginx", ["nginx", "-s", "reload"])
+    except docker_api.ERRORS as e:
+        warning(f"nginx -s reload: {e}")
+        return False
+    if result.exit_code != 0:
+        warning(f"nginx -s reload: {result.output.strip()}")
+    return result.exit_code == 0
+
+def show_containers():
+    """Состояние контейнеров проекта (аналог docker compose ps)"""
+    client = docker()
+    if client is None:
+        run_cmd(f"cd {INSTALL_DIR} && docker compose ps")
+        return
+    import docker_api
+    try:
+        containers = client.containers({"label": [f"com.docker.compose.project={PROJECT_NAME}"]})
+    except docker_api.ERRORS as e:
+        warning(f"Не удалось получить список контейнеров: {e}")
+        return
+    for c in containers:
+        color = Colors.GREEN if c.state == "running" and c.health != "unhealthy" else Colors.YELLOW
+        log(f"   {c.name:<28} {c.state:<10} {c.status}", color)
+
+def build_images():
+    """Собрать образы web, lead и rum через Docker API с живым логом (False - собирать через compose)"""
+    client = docker()
+    if client is None:
+        return False
+    import docker_api
+    for service, context in BUILD_CONTEXTS.items():
+        tag = f"{PROJECT_NAME}-{service}:latest"
+        log(f"Docker API: build {tag} ({context})", Colors.BLUE)
+        try:
+            for item in client.build(f"{INSTALL_DIR}/{context}", tag,
+                                     labels={"com.docker.compose.project": PROJECT_NAME}):
+                if item.get("stream"):
+                    print(item["stream"], end="", flush=True)
+        except docker_api.DockerError as e:
+            error(f"Сборка {tag} не удалась: {e.message}")
+        except docker_api.ERRORS as e:
+            warning(f"Docker API: сборка {tag} прервана ({e}), собираю через docker compose")
+            return False
+    return True
+
 def check_root():
     """Проверка root прав"""
     if os.geteuid() != 0:
@@ -89,7 +163,16 @@ def create_backup(no_backup=False):
         shutil.copytree(f"{INSTALL_DIR}/src", backup_path)
         log(f"Резервная копия создана: {backup_path}")
     else:
-        warning("Папка src не найдена, резервная копия не создана")
+        warning("Папка src не найдена, резервная копия исходников не создана")
+    
+    # Конфигурацию write_configs перезапишет: сохраняем ручные правки
+    config_backup = f"{backup_path}/_config"
+    for name in CONFIG_FILES:
+        if os.path.exists(f"{INSTALL_DIR}/{name}"):
+            os.makedirs(os.path.dirname(f"{config_backup}/{name}"), exist_ok=True)
+            shutil.copy2(f"{INSTALL_DIR}/{name}", f"{config_backup}/{name}")
+    if os.path.exists(config_backup):
+        log(f"Конфигурация сохранена: {config_backup}")
 
 def update_content():
     """Обновление контента сайта"""
@@ -106,21 +189,63 @@ def update_content():
     
     # Копируем новые
     run_cmd(f"cp -r {temp_dir}/src {INSTALL_DIR}/")
+    run_cmd(f"cp {temp_dir}/build.py {temp_dir}/docker_api.py {INSTALL_DIR}/")
+    run_cmd(f"rm -rf {INSTALL_DIR}/services", check=False)
+    run_cmd(f"cp -r {temp_dir}/services {INSTALL_DIR}/")
+    
+    # Конфигурация из новой версии: новые сервисы и маршруты /api/*
+    write_configs(temp_dir)
     
     # Очищаем временную папку
     run_cmd(f"rm -rf {temp_dir}")
     
     log("Контент обновлён!")
 
+def write_configs(temp_dir):
+    """Перегенерация docker-compose.yml, Dockerfile и site.conf по шаблонам deploy.py"""
+    log("Обновляю docker-compose.yml, Dockerfile и конфигурацию Nginx...")
+    
+    # Шаблоны живут в deploy.py: берём их из только что клонированной версии
+    spec = importlib.util.spec_from_file_location("deploy", f"{temp_dir}/deploy.py")
+    deploy = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(deploy)
+    
+    deploy.write_docker_compose()
+    deploy.write_dockerfile()
+    if os.path.exists(f"{INSTALL_DIR}/letsencrypt/live/{DOMAIN}/fullchain.pem"):
+        deploy.write_nginx_config_with_ssl()
+    else:
+        deploy.write_nginx_config()
+
 def rebuild_containers():
     """Пересборка контейнеров"""
     log("Пересобираю контейнеры...")
     
-    # Пересобираем только веб-контейнер
-    run_cmd(f"cd {INSTALL_DIR} && docker compose up -d --build web")
+    # Пересобираем веб-контейнер и сервисы заявок и RUM-метрик (через API - с живым
+    # логом сборки); nginx поднимется, если его ещё нет или изменилось описание в compose
+    if build_images():
+        run_cmd(f"cd {INSTALL_DIR} && docker compose up -d --no-build nginx web lead rum")
+    else:
+        run_cmd(f"cd {INSTALL_DIR} && docker compose up -d --build nginx web lead rum")
     
-    # Ждем немного
-    time.sleep(5)
+    # Ждём healthy по событиям Docker (без API - просто паузу)
+    client = docker()
+    if client is None:
+        time.sleep(5)
+    else:
+        import docker_api
+        for service in ("web", "lead", "rum"):
+            container = f"{PROJECT_NAME}-{service}"
+            log(f"Docker API: жду готовности {container}", Colors.BLUE)
+            try:
+                status = client.wait_healthy(container, timeout=120)
+            except docker_api.ERRORS as e:
+                status = getattr(e, "message", None) or str(e)
+            if status not in ("healthy", "running"):
+                warning(f"{container}: {status}")
+    
+    # site.conf мог измениться, а upstream'ы lead/rum теперь резолвятся
+    reload_nginx()
     
     log("Контейнеры пересобраны!")
 
@@ -132,11 +257,23 @@ def cleanup_old_images(no_cleanup=False):
     
     log("Очищаю старые Docker образы...")
     
-    # Удаляем неиспользуемые образы
-    run_cmd("docker image prune -f", check=False)
-    
-    # Удаляем старые контейнеры
-    run_cmd("docker container prune -f", check=False)
+    client = docker()
+    if client is None:
+        # Удаляем неиспользуемые образы
+        run_cmd("docker image prune -f", check=False)
+        
+        # Удаляем старые контейнеры
+        run_cmd("docker container prune -f", check=False)
+    else:
+        import docker_api
+        log("Docker API: prune images, containers", Colors.BLUE)
+        freed = 0
+        for prune in (client.prune_images, client.prune_containers):
+            try:
+                freed += (prune() or {}).get("SpaceReclaimed") or 0
+            except docker_api.ERRORS as e:
+                warning(f"Очистка не удалась: {e}")
+        log(f"Освобождено: {freed / 1024 / 1024:.1f} МБ")
     
     log("Очистка завершена!")
 
@@ -146,7 +283,7 @@ def check_health(quick=False):
     
     if not quick:
         # Проверяем статус контейнеров
-        run_cmd(f"cd {INSTALL_DIR} && docker compose ps")
+        show_containers()
     
     # Проверяем доступность сайта
     http_test = run_cmd(f"curl -I http://{DOMAIN}", check=False)
@@ -160,7 +297,20 @@ def check_health(quick=False):
 def show_logs():
     """Показ логов"""
     log("Показываю последние логи...")
-    run_cmd(f"cd {INSTALL_DIR} && docker compose logs --tail=20")
+    client = docker()
+    if client is None:
+        run_cmd(f"cd {INSTALL_DIR} && docker compose logs --tail=20")
+        return
+    import docker_api
+    for service in ("nginx", "web", "lead", "rum"):
+        container = f"{PROJECT_NAME}-{service}"
+        try:
+            output = client.logs(container, tail=20)
+        except docker_api.ERRORS as e:
+            warning(f"Логи {container}: {e}")
+            continue
+        for line in output.splitlines():
+            print(f"{container:<22} | {line}")
 
 def cleanup_old_backups():
     """Очистка старых резервных копий (оставляем только 5 последних)"""